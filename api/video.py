@@ -291,7 +291,8 @@ Compress a previously uploaded video.
                     input_path,
                     split_folder,
                     split_duration,
-                    f"{file_id}_segment"
+                    f"{file_id}_segment",
+                    total_duration=video_duration
                 )
                 
                 if not split_result.success:
@@ -9,12 +9,26 @@ bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
 backlog = 2048
 
 # Worker processes
-workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
-worker_class = 'sync'
+# One process per core keeps Python-side request work (parsing, JSON,
+# sessions) off a shared GIL; threads in each worker cover the time
+# requests spend waiting on ffmpeg
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
 worker_connections = 1000
 timeout = 300  # 5 minutes - important for video processing
 keepalive = 2
 
+# Recycle workers now and then to cap slow memory growth from
+# long-running image/video processing
+max_requests = 1000
+max_requests_jitter = 100
+
+# Import the app once in the master and fork workers from it, so module
+# setup (ffmpeg/encoder lookups, algorithm tables) is shared copy-on-write.
+# Enable with GUNICORN_PRELOAD=1; code changes then need a full restart.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
 # Process naming
 proc_name = 'videopress'
 
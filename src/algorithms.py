@@ -8,12 +8,17 @@ while keeping file sizes under WhatsApp's limits.
 Now enhanced with ML-based content analysis for the Neural algorithm!
 """
 
+import asyncio
 import ffmpeg
+import glob
 import os
 import math
+import subprocess
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, Tuple
+from typing import Callable, FrozenSet, List, Optional, Sequence, Tuple
+
+from .splitter import get_probe
 
 # ML Analyzer for content-aware compression
 try:
@@ -61,6 +66,9 @@ def probe_video(input_path: str) -> VideoInfo:
     """
     Analyze video file and extract metadata.
     
+    The ffprobe output is memoized by get_probe, so the upload handler and
+    each algorithm run share a single ffprobe call.
+    
     Args:
         input_path: Path to the video file
         
@@ -68,7 +76,7 @@ def probe_video(input_path: str) -> VideoInfo:
         VideoInfo object with video metadata
     """
     try:
-        probe = ffmpeg.probe(input_path)
+        probe = get_probe(input_path)
         video_stream = next(
             (s for s in probe['streams'] if s['codec_type'] == 'video'), None
         )
@@ -116,6 +124,225 @@ def probe_video(input_path: str) -> VideoInfo:
         raise RuntimeError(f"FFmpeg probe error: {e.stderr.decode() if e.stderr else str(e)}")
 
 
+# x264 preset names mapped onto the closest NVENC preset (p1 fastest, p7 best)
+NVENC_PRESETS = {
+    'veryslow': 'p7',
+    'slower': 'p7',
+    'slow': 'p7',
+    'medium': 'p5',
+    'fast': 'p4',
+    'faster': 'p3',
+    'veryfast': 'p2',
+}
+
+
+# x264 threads per encode; 0 = ffmpeg's automatic choice (every core).
+# split_and_compress lowers it in its worker processes so parallel segment
+# encodes share the CPU instead of each starting a thread per core.
+ENCODER_THREADS = int(os.environ.get('MEDIAPRESS_ENCODER_THREADS', 0))
+
+
+def _thread_args() -> dict:
+    """ffmpeg output option capping x264 threads, if a cap is set"""
+    return {'threads': ENCODER_THREADS} if ENCODER_THREADS else {}
+
+
+# =============================================================================
+# X264 PARAMETER STRINGS
+# =============================================================================
+# Fixed per-algorithm settings, joined once at import. Multi-value options
+# (psy-rd, deblock) use ',' because ':' separates x264-params entries.
+
+# Neural Preserve - content-adapted AQ/psy/deblock are prepended per call
+_X264_PARAMS_NEURAL = ':'.join([
+    # Motion estimation
+    'me=umh',
+    'subme=10',
+    'ref=6',
+    'merange=24',
+    
+    # B-frames
+    'bframes=5',
+    'b-adapt=2',
+    'b-pyramid=normal',
+    
+    # Rate control
+    'rc-lookahead=60',
+    'mbtree=1',
+    'qcomp=0.7',
+    
+    # Partitioning
+    'analyse=all',
+    'direct=auto',
+    
+    # Trellis
+    'trellis=2',
+    
+    # Quality preservation
+    'no-fast-pskip=1',
+    'no-dct-decimate=1',
+    'weightp=2',
+    'weightb=1',
+])
+
+# Bitrate Sculptor pass 1
+_X264_PARAMS_SCULPTOR_PASS1 = ':'.join([
+    'keyint=60',            # Keyframe every 60 frames
+    'min-keyint=30',        # Minimum keyframe interval
+    'scenecut=40',          # Scene change detection
+    'b-adapt=2',            # Optimal B-frame decision
+    'bframes=3',            # Use B-frames
+    # Analysis-only pass: collect rate stats, skip costly
+    # decisions. mbtree must stay on - pass 2 reads its stats.
+    'ref=1',
+    'subme=2',
+    'me=dia',
+    'trellis=0',
+    'analyse=none',
+    '8x8dct=0',
+])
+
+# Bitrate Sculptor pass 2 - subme is appended per call from speed_level
+_X264_PARAMS_SCULPTOR_PASS2 = ':'.join([
+    'keyint=60',
+    'min-keyint=30',
+    'scenecut=40',
+    'b-adapt=2',
+    'bframes=3',
+    'ref=3',
+    'direct=auto',          # Optimal direct mode
+    'me=umh',               # Wider search, cheaper than RD refinement
+    'trellis=1',            # Rate-distortion optimization
+    'psy-rd=1.0,0.15',      # Psy RD strength, psy trellis
+    'aq-mode=2',            # Auto-variance AQ
+    'aq-strength=0.8',
+    'fast-pskip=1',
+    'mixed-refs=0',
+])
+
+# Quantum Compress
+_X264_PARAMS_QUANTUM = ':'.join([
+    'keyint=120',            # Larger GOP for compression
+    'min-keyint=60',
+    'bframes=2',             # Cheap with b-adapt=1, needed for AQ to pay off
+    'ref=2',
+    'me=hex',                # Fast motion estimation
+    'subme=4',               # Faster subpel
+    'aq-mode=3',             # Auto-variance AQ, biased to dark scenes
+    'aq-strength=1.0',
+    'rc-lookahead=40',       # MB-tree (on by default) lookahead
+])
+
+
+# H.264 encoders looked for in the FFmpeg build. Only NVENC and libx264 are
+# driven today; QSV/VAAPI/VideoToolbox are recorded for capability reporting.
+H264_ENCODERS = ('h264_nvenc', 'h264_qsv', 'h264_vaapi', 'h264_videotoolbox', 'libx264')
+
+
+@dataclass(frozen=True)
+class CompressionBackend:
+    """FFmpeg encoding capabilities, probed once at import"""
+    encoders: FrozenSet[str]         # H.264 encoders listed by this FFmpeg build
+    hwaccel: Optional[str]           # 'cuda' when NVDEC/NVENC passed a trial encode
+    h264: str                        # Encoder for the accelerated path
+    scale_filter: str                # Scaler matching the decode device
+    cpu_h264: str = 'libx264'        # Encoder for the CPU path / fallback
+    
+    def preset(self, x264_preset: str) -> str:
+        """Map an x264 preset name onto this backend's preset names"""
+        if self.hwaccel == 'cuda':
+            return NVENC_PRESETS.get(x264_preset, 'p7')
+        return x264_preset
+
+
+def _probe_backend() -> CompressionBackend:
+    """
+    Detect available encoders and hardware acceleration.
+    
+    Many FFmpeg builds list h264_nvenc even when no NVIDIA GPU is present,
+    so a tiny trial encode through scale_cuda confirms the device works.
+    """
+    encoders = frozenset()
+    hwaccel = None
+    try:
+        listing = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            capture_output=True, text=True, timeout=10
+        ).stdout
+        encoders = frozenset(e for e in H264_ENCODERS if e in listing)
+        
+        if 'h264_nvenc' in encoders:
+            trial = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-loglevel', 'error',
+                 '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1',
+                 '-vf', 'format=nv12,hwupload_cuda,scale_cuda=128:128:format=yuv420p',
+                 '-c:v', 'h264_nvenc', '-f', 'null', '-'],
+                capture_output=True, timeout=30
+            )
+            if trial.returncode == 0:
+                hwaccel = 'cuda'
+    except (OSError, subprocess.SubprocessError):
+        pass
+    
+    if hwaccel == 'cuda':
+        return CompressionBackend(encoders, hwaccel, 'h264_nvenc', 'scale_cuda')
+    return CompressionBackend(encoders, None, 'libx264', 'scale')
+
+
+BACKEND = _probe_backend()
+
+
+def hw_accel() -> Optional[str]:
+    """
+    Hardware decode/encode device in use.
+    
+    Returns:
+        'cuda' when NVDEC/NVENC can be used, None for the CPU (libx264) path
+    """
+    return BACKEND.hwaccel
+
+
+def _remove_passlogs(passlog_prefix: str):
+    """Delete x264 pass log files (.log, .log.mbtree, -0.log, ...) for a prefix"""
+    for log_file in glob.glob(glob.escape(passlog_prefix) + '*.log*'):
+        try:
+            os.remove(log_file)
+        except FileNotFoundError:
+            pass
+
+
+def _encode_with_fallback(encode: Callable[[bool], None]) -> None:
+    """
+    Run an encode on the GPU when available, retrying on the CPU path.
+    
+    NVDEC cannot decode every input codec, so a failed GPU attempt falls
+    back to libx264 instead of failing the whole compression.
+    
+    Args:
+        encode: Callable taking use_gpu and running the FFmpeg graph(s)
+    """
+    if hw_accel() == 'cuda':
+        try:
+            encode(True)
+            return
+        except ffmpeg.Error as e:
+            err = e.stderr.decode(errors='ignore')[-300:] if e.stderr else str(e)
+            print(f"[HW Accel] NVENC encode failed, retrying on CPU: {err}")
+    encode(False)
+
+
+def _gpu_scale(video, width: int, height: int, **kwargs):
+    """
+    Scale on the GPU with scale_cuda, then download frames for CPU filters.
+    
+    scale_cuda converts to yuv420p during the resize, so downloaded frames
+    reach hqdn3d/unsharp and the encoder without an extra swscale pass.
+    """
+    video = video.filter(BACKEND.scale_filter, width, height, format='yuv420p', **kwargs)
+    video = video.filter('hwdownload')
+    return video.filter('format', 'yuv420p')
+
+
 def calculate_target_bitrate(
     duration: float,
     target_size_mb: float = 15.5,
@@ -291,62 +518,101 @@ def compress_neural_preserve(
     # Adjust encoding parameters based on content type
     if content_type_str == "talking_head":
         # Prioritize face quality
-        psy_rd = "1.5:0.3"       # Higher psy for face detail
+        psy_rd = "1.5,0.3"       # Higher psy for face detail
         aq_strength = "1.0"      # Strong AQ for skin tones
-        deblock = "0:0"          # Less deblocking to preserve face detail
+        deblock = "0,0"          # Less deblocking to preserve face detail
         preset = "veryslow"
         denoise_strength = 1     # Minimal denoising for faces
     elif content_type_str == "action":
         # Prioritize motion handling
-        psy_rd = "1.0:0.15"
+        psy_rd = "1.0,0.15"
         aq_strength = "0.8"
-        deblock = "-1:-1"
+        deblock = "-1,-1"
         preset = "slower"        # Faster preset OK for motion
         denoise_strength = 3     # More denoising OK for motion
     elif content_type_str == "nature":
         # Prioritize detail and color
-        psy_rd = "1.3:0.25"
+        psy_rd = "1.3,0.25"
         aq_strength = "0.9"
-        deblock = "-1:-1"
+        deblock = "-1,-1"
         preset = "veryslow"
         denoise_strength = 2
     elif content_type_str == "screen":
         # Prioritize sharpness and text
-        psy_rd = "0.8:0.1"       # Lower psy for clean edges
+        psy_rd = "0.8,0.1"       # Lower psy for clean edges
         aq_strength = "0.6"
-        deblock = "0:0"
+        deblock = "0,0"
         preset = "veryslow"
         denoise_strength = 0     # No denoising for screen content
     else:
         # General content
-        psy_rd = "1.2:0.25"
+        psy_rd = "1.2,0.25"
         aq_strength = "0.9"
-        deblock = "-1:-1"
+        deblock = "-1,-1"
         preset = "veryslow"
         denoise_strength = 2
     
     # Calculate optimal fps
     target_fps = min(video_info.fps, 30) if video_info.fps > 0 else 30
     
-    try:
-        stream = ffmpeg.input(input_path)
-        video = stream.video
+    # =========================================================================
+    # X264 ENCODING PARAMETERS (ML-OPTIMIZED)
+    # =========================================================================
+    
+    x264_params = ':'.join([
+        # Adaptive Quantization
+        'aq-mode=3',
+        f'aq-strength={aq_strength}',
+        
+        # Psycho-visual (content-adapted)
+        f'psy-rd={psy_rd}',
+        
+        # Deblocking (content-adapted)
+        f'deblock={deblock}',
+        
+        _X264_PARAMS_NEURAL,
+    ])
+    
+    # Add face-specific tuning if faces detected. tune is an encoder
+    # option, not an x264-params key.
+    x264_tune = None
+    if has_faces and face_coverage > 0.05:
+        x264_tune = 'film'  # Film tune preserves grain/detail
+    
+    def encode(use_gpu: bool):
+        if use_gpu:
+            # NVDEC decode, frames stay in GPU memory for scaling
+            stream = ffmpeg.input(input_path, hwaccel='cuda',
+                                  hwaccel_output_format='cuda')
+        else:
+            stream = ffmpeg.input(input_path)
         
         # =====================================================================
         # VIDEO PROCESSING PIPELINE
         # =====================================================================
+        # Ordered so every stage touches as few pixels as possible:
+        # drop frames first, then downscale, then denoise/sharpen.
+        video = stream.video
+        
+        # 1. Frame rate handling
+        if video_info.fps > 30:
+            video = video.filter('fps', fps=target_fps)
         
-        # 1. High-quality Lanczos scaling
-        video = video.filter('scale', new_width, new_height, 
-                            flags='lanczos',
-                            force_original_aspect_ratio='decrease')
+        # 2. High-quality Lanczos scaling
+        if use_gpu:
+            video = _gpu_scale(video, new_width, new_height,
+                               interp_algo='lanczos')
+        else:
+            video = video.filter('scale', new_width, new_height, 
+                                 flags='lanczos',
+                                 force_original_aspect_ratio='decrease')
         
-        # 2. Ensure even dimensions
+        # 3. Ensure even dimensions
         video = video.filter('pad', 
                             f'ceil(iw/2)*2', 
                             f'ceil(ih/2)*2')
         
-        # 3. Content-adaptive denoising (skip for screen content)
+        # 4. Content-adaptive denoising (skip for screen content)
         if denoise_strength > 0:
             video = video.filter('hqdn3d', 
                                 luma_spatial=denoise_strength,
@@ -354,7 +620,7 @@ def compress_neural_preserve(
                                 luma_tmp=denoise_strength + 1,
                                 chroma_tmp=denoise_strength + 1)
         
-        # 4. Adaptive sharpening (stronger for faces and detail)
+        # 5. Adaptive sharpening (stronger for faces and detail)
         if content_type_str == "talking_head":
             # Subtle sharpening for faces - avoid harsh edges
             video = video.filter('unsharp', 
@@ -366,75 +632,40 @@ def compress_neural_preserve(
                                 luma_msize_x=3, luma_msize_y=3, luma_amount=0.3,
                                 chroma_msize_x=3, chroma_msize_y=3, chroma_amount=0.1)
         
-        # 5. Frame rate handling
-        if video_info.fps > 30:
-            video = video.filter('fps', fps=target_fps)
-        
-        # =====================================================================
-        # X264 ENCODING PARAMETERS (ML-OPTIMIZED)
-        # =====================================================================
-        
-        x264_params = [
-            # Adaptive Quantization
-            'aq-mode=3',
-            f'aq-strength={aq_strength}',
-            
-            # Psycho-visual (content-adapted)
-            f'psy-rd={psy_rd}',
-            
-            # Motion estimation
-            'me=umh',
-            'subme=10',
-            'ref=6',
-            'merange=24',
-            
-            # B-frames
-            'bframes=5',
-            'b-adapt=2',
-            'b-pyramid=normal',
-            
-            # Rate control
-            'rc-lookahead=60',
-            'mbtree=1',
-            'qcomp=0.7',
-            
-            # Deblocking (content-adapted)
-            f'deblock={deblock}',
-            
-            # Partitioning
-            'analyse=all',
-            'direct=auto',
-            
-            # Trellis
-            'trellis=2',
-            
-            # Quality preservation
-            'no-fast-pskip=1',
-            'no-dct-decimate=1',
-            'weightp=2',
-            'weightb=1',
-        ]
-        
-        # Add face-specific tuning if faces detected
-        if has_faces and face_coverage > 0.05:
-            x264_params.append('tune=film')  # Film tune preserves grain/detail
-        
         output_args = {
-            'c:v': 'libx264',
-            'crf': crf_value,
-            'preset': preset,
             'profile:v': 'high',
             'level': '4.2',
             'pix_fmt': 'yuv420p',
             'movflags': '+faststart',
             'maxrate': f'{int(target_bitrate * 1.5)}',
             'bufsize': f'{int(target_bitrate * 3)}',
-            'x264-params': ':'.join(x264_params),
             'colorspace': 'bt709',
             'color_primaries': 'bt709',
             'color_trc': 'bt709',
         }
         
+        if use_gpu:
+            # NVENC: constant-quality VBR capped at the target bitrate
+            output_args.update({
+                'c:v': BACKEND.h264,
+                'preset': BACKEND.preset(preset),
+                'rc': 'vbr',
+                'cq': crf_value,
+                'b:v': f'{target_bitrate}',
+                'spatial-aq': 1,
+                'rc-lookahead': 32,
+            })
+        else:
+            output_args.update({
+                'c:v': BACKEND.cpu_h264,
+                'crf': crf_value,
+                'preset': preset,
+                'x264-params': x264_params,
+                **_thread_args(),
+            })
+            if x264_tune:
+                output_args['tune'] = x264_tune
+        
         # Premium audio encoding
         if video_info.has_audio:
             audio = stream.audio
@@ -447,8 +678,11 @@ def compress_neural_preserve(
         else:
             output = ffmpeg.output(video, output_path, **output_args)
         
-        # Run encoding
         ffmpeg.run(output, overwrite_output=True, capture_stderr=True)
+    
+    try:
+        # Run encoding
+        _encode_with_fallback(encode)
         
         # Verify output
         compressed_size = os.path.getsize(output_path)
@@ -495,7 +729,8 @@ def compress_neural_preserve(
 def compress_bitrate_sculptor(
     input_path: str,
     output_path: str,
-    target_size_mb: float = 15.5
+    target_size_mb: float = 15.5,
+    speed_level: int = 7
 ) -> CompressionResult:
     """
     Algorithm 2: Bitrate Sculptor - Dynamic Bitrate Allocation
@@ -508,12 +743,18 @@ def compress_bitrate_sculptor(
     - Applying adaptive GOP (Group of Pictures) sizing
     
     Best for: Vlogs, mixed content, varying complexity videos
+    
+    speed_level (0-10) trades pass-2 subpel refinement for speed:
+    0 -> subme=10, 5 -> subme=7, 10 -> subme=4 (default 7 -> subme=6).
     """
     video_info = probe_video(input_path)
     new_width, new_height = get_optimal_resolution(
         video_info.width, video_info.height, Algorithm.BITRATE_SCULPTOR
     )
     
+    speed_level = min(max(speed_level, 0), 10)
+    subme = round(10 - 0.6 * speed_level)
+    
     target_bitrate = calculate_target_bitrate(
         video_info.duration, target_size_mb, 128
     )
@@ -521,82 +762,92 @@ def compress_bitrate_sculptor(
     # Bitrate Sculptor uses target bitrate with 2-pass
     passlog_prefix = output_path.replace('.mp4', '_passlog')
     
-    try:
-        # ========== PASS 1: Analysis ==========
-        stream = ffmpeg.input(input_path)
-        video = stream.video.filter('scale', new_width, new_height)
-        
-        pass1_args = {
-            'c:v': 'libx264',
-            'b:v': target_bitrate,
-            'pass': 1,
-            'passlogfile': passlog_prefix,
-            'preset': 'medium',
-            'f': 'null',
-            'an': None,  # No audio in first pass
-            'x264-params': ':'.join([
-                'keyint=60',            # Keyframe every 60 frames
-                'min-keyint=30',        # Minimum keyframe interval
-                'scenecut=40',          # Scene change detection
-                'b-adapt=2',            # Optimal B-frame decision
-                'bframes=3',            # Use B-frames
-                'ref=3',                # Reference frames
-            ])
-        }
-        
-        # First pass outputs to null (analysis only)
-        pass1_output = ffmpeg.output(video, '/dev/null', **pass1_args)
-        ffmpeg.run(pass1_output, overwrite_output=True, capture_stderr=True)
-        
-        # ========== PASS 2: Encoding ==========
-        stream = ffmpeg.input(input_path)
-        video = stream.video.filter('scale', new_width, new_height)
-        
-        # Apply temporal denoising for cleaner compression
-        video = video.filter('hqdn3d', luma_spatial=2, chroma_spatial=2, 
-                            luma_tmp=3, chroma_tmp=3)
-        
-        pass2_args = {
-            'c:v': 'libx264',
-            'b:v': target_bitrate,
-            'pass': 2,
-            'passlogfile': passlog_prefix,
-            'preset': 'medium',
-            'profile:v': 'main',
-            'level': '4.0',
-            'pix_fmt': 'yuv420p',
-            'movflags': '+faststart',
-            'x264-params': ':'.join([
-                'keyint=60',
-                'min-keyint=30',
-                'scenecut=40',
-                'b-adapt=2',
-                'bframes=3',
-                'ref=3',
-                'direct=auto',          # Optimal direct mode
-                'me=hex',               # Fast motion estimation
-                'subme=7',              # Good subpel quality
-                'trellis=1',            # Rate-distortion optimization
-            ])
-        }
+    def encode(use_gpu: bool):
+        if use_gpu:
+            # ========== NVENC: 2-pass in a single invocation ==========
+            # multipass=fullres runs the analysis pass inside the encoder,
+            # so the input is decoded once and no pass log is written.
+            stream = ffmpeg.input(input_path, hwaccel='cuda',
+                                  hwaccel_output_format='cuda')
+            video = _gpu_scale(stream.video, new_width, new_height)
+            video = video.filter('hqdn3d', luma_spatial=2, chroma_spatial=2, 
+                                luma_tmp=3, chroma_tmp=3)
+            
+            encode_args = {
+                'c:v': BACKEND.h264,
+                'preset': BACKEND.preset('medium'),
+                'rc': 'vbr',
+                'multipass': 'fullres',
+                'b:v': target_bitrate,
+                'maxrate': int(target_bitrate * 1.5),
+                'bufsize': int(target_bitrate * 2),
+                'g': 60,
+                'bf': 3,
+                'profile:v': 'main',
+                'level': '4.0',
+                'pix_fmt': 'yuv420p',
+                'movflags': '+faststart',
+            }
+        else:
+            # ========== PASS 1: Analysis ==========
+            stream = ffmpeg.input(input_path)
+            video = stream.video.filter('scale', new_width, new_height)
+            
+            pass1_args = {
+                'c:v': BACKEND.cpu_h264,
+                'b:v': target_bitrate,
+                'pass': 1,
+                'passlogfile': passlog_prefix,
+                'preset': 'medium',
+                'f': 'null',
+                'an': None,  # No audio in first pass
+                'x264-params': _X264_PARAMS_SCULPTOR_PASS1,
+                **_thread_args(),
+            }
+            
+            # First pass outputs to null (analysis only)
+            pass1_output = ffmpeg.output(video, '/dev/null', **pass1_args)
+            ffmpeg.run(pass1_output, overwrite_output=True, capture_stderr=True)
+            
+            # ========== PASS 2: Encoding ==========
+            stream = ffmpeg.input(input_path)
+            video = stream.video.filter('scale', new_width, new_height)
+            
+            # Apply temporal denoising for cleaner compression
+            video = video.filter('hqdn3d', luma_spatial=2, chroma_spatial=2, 
+                                luma_tmp=3, chroma_tmp=3)
+            
+            encode_args = {
+                'c:v': BACKEND.cpu_h264,
+                'b:v': target_bitrate,
+                'pass': 2,
+                'passlogfile': passlog_prefix,
+                'preset': 'medium',
+                'profile:v': 'main',
+                'level': '4.0',
+                'pix_fmt': 'yuv420p',
+                'movflags': '+faststart',
+                'x264-params': f'{_X264_PARAMS_SCULPTOR_PASS2}:subme={subme}',
+                **_thread_args(),
+            }
         
         # Handle audio
         if video_info.has_audio:
             audio = stream.audio
-            pass2_args['c:a'] = 'aac'
-            pass2_args['b:a'] = '128k'
-            pass2_args['ar'] = '44100'
-            output = ffmpeg.output(video, audio, output_path, **pass2_args)
+            encode_args['c:a'] = 'aac'
+            encode_args['b:a'] = '128k'
+            encode_args['ar'] = '44100'
+            output = ffmpeg.output(video, audio, output_path, **encode_args)
         else:
-            output = ffmpeg.output(video, output_path, **pass2_args)
+            output = ffmpeg.output(video, output_path, **encode_args)
         
         ffmpeg.run(output, overwrite_output=True, capture_stderr=True)
+    
+    try:
+        _encode_with_fallback(encode)
         
         # Cleanup pass log files
-        for ext in ['.log', '.log.mbtree', '-0.log', '-0.log.mbtree']:
-            log_file = passlog_prefix + ext
-            if os.path.exists(log_file):
-                os.remove(log_file)
+        _remove_passlogs(passlog_prefix)
         
         # Verify output
         compressed_size = os.path.getsize(output_path)
@@ -614,10 +865,7 @@ def compress_bitrate_sculptor(
         
     except ffmpeg.Error as e:
         # Cleanup on error
-        for ext in ['.log', '.log.mbtree', '-0.log', '-0.log.mbtree']:
-            log_file = passlog_prefix + ext
-            if os.path.exists(log_file):
-                os.remove(log_file)
+        _remove_passlogs(passlog_prefix)
                 
         return CompressionResult(
             success=False,
@@ -650,7 +898,7 @@ def compress_quantum_compress(
     - Using higher CRF values for aggressive quantization
     - Reducing resolution more aggressively
     - Applying noise reduction before encoding
-    - Using faster presets with tuning for compression
+    - Using a fast preset with adaptive quantization and MB-tree kept on
     - Reducing frame rate if very high
     - Lower audio bitrate
     
@@ -667,41 +915,54 @@ def compress_quantum_compress(
     # Reduce framerate if above 30fps
     target_fps = min(video_info.fps, 30)
     
-    try:
-        stream = ffmpeg.input(input_path)
+    def encode(use_gpu: bool):
+        if use_gpu:
+            stream = ffmpeg.input(input_path, hwaccel='cuda',
+                                  hwaccel_output_format='cuda')
+        else:
+            stream = ffmpeg.input(input_path)
         video = stream.video
         
+        # Reduce framerate first so later filters see fewer frames
+        if video_info.fps > 30:
+            video = video.filter('fps', fps=target_fps)
+        
+        # Scale down before denoising - hqdn3d cost scales with pixel count
+        if use_gpu:
+            video = _gpu_scale(video, new_width, new_height)
+        else:
+            video = video.filter('scale', new_width, new_height)
+        
         # Apply aggressive noise reduction
         video = video.filter('hqdn3d', luma_spatial=4, chroma_spatial=4,
                             luma_tmp=6, chroma_tmp=6)
         
-        # Scale down
-        video = video.filter('scale', new_width, new_height)
-        
-        # Reduce framerate if needed
-        if video_info.fps > 30:
-            video = video.filter('fps', fps=target_fps)
-        
-        output_args = {
-            'c:v': 'libx264',
-            'crf': crf_value,
-            'preset': 'faster',          # Faster encoding, still good compression
-            'tune': 'fastdecode',        # Optimize for fast playback
-            'profile:v': 'baseline',     # Most compatible, smaller
-            'level': '3.1',
-            'pix_fmt': 'yuv420p',
-            'movflags': '+faststart',
-            'x264-params': ':'.join([
-                'keyint=120',            # Larger GOP for compression
-                'min-keyint=60',
-                'bframes=0',             # No B-frames for simplicity
-                'ref=1',                 # Minimal references
-                'me=dia',                # Fast motion estimation
-                'subme=4',               # Faster subpel
-                'aq-mode=0',             # No adaptive quantization
-                'no-mbtree=1',           # Disable macroblock tree
-            ])
-        }
+        if use_gpu:
+            output_args = {
+                'c:v': BACKEND.h264,
+                'preset': BACKEND.preset('faster'),
+                'rc': 'vbr',
+                'cq': crf_value,
+                'b:v': 0,                # Pure constant-quality mode
+                'g': 120,
+                'bf': 0,
+                'profile:v': 'baseline',
+                'level': '3.1',
+                'pix_fmt': 'yuv420p',
+                'movflags': '+faststart',
+            }
+        else:
+            output_args = {
+                'c:v': BACKEND.cpu_h264,
+                'crf': crf_value,
+                'preset': 'veryfast',        # Fast encoding; AQ/MB-tree recover the size
+                'profile:v': 'main',         # Baseline would silently drop B-frames
+                'level': '3.1',
+                'pix_fmt': 'yuv420p',
+                'movflags': '+faststart',
+                'x264-params': _X264_PARAMS_QUANTUM,
+                **_thread_args(),
+            }
         
         # Handle audio with lower bitrate
         if video_info.has_audio:
@@ -715,6 +976,9 @@ def compress_quantum_compress(
             output = ffmpeg.output(video, output_path, **output_args)
         
         ffmpeg.run(output, overwrite_output=True, capture_stderr=True)
+    
+    try:
+        _encode_with_fallback(encode)
         
         # Verify output
         compressed_size = os.path.getsize(output_path)
@@ -746,6 +1010,14 @@ def compress_quantum_compress(
 # MAIN COMPRESSION FUNCTION
 # =============================================================================
 
+# Algorithm -> compressor
+_ALGO_DISPATCH = {
+    Algorithm.NEURAL_PRESERVE: compress_neural_preserve,
+    Algorithm.BITRATE_SCULPTOR: compress_bitrate_sculptor,
+    Algorithm.QUANTUM_COMPRESS: compress_quantum_compress,
+}
+
+
 def compress_video(
     input_path: str,
     output_path: str,
@@ -764,14 +1036,68 @@ def compress_video(
     Returns:
         CompressionResult with compression statistics
     """
-    if algorithm == Algorithm.NEURAL_PRESERVE:
-        return compress_neural_preserve(input_path, output_path, target_size_mb)
-    elif algorithm == Algorithm.BITRATE_SCULPTOR:
-        return compress_bitrate_sculptor(input_path, output_path, target_size_mb)
-    elif algorithm == Algorithm.QUANTUM_COMPRESS:
-        return compress_quantum_compress(input_path, output_path, target_size_mb)
-    else:
+    try:
+        compress = _ALGO_DISPATCH[algorithm]
+    except KeyError:
         raise ValueError(f"Unknown algorithm: {algorithm}")
+    return compress(input_path, output_path, target_size_mb)
+
+
+# Concurrent encodes allowed per batch. Consumer NVIDIA drivers cap NVENC
+# sessions (historically 3); x264 already spreads one encode over all cores.
+NVENC_SESSION_LIMIT = 3
+CPU_CONCURRENT_ENCODES = 2
+
+
+async def compress_video_async(
+    input_path: str,
+    output_path: str,
+    algorithm: Algorithm,
+    target_size_mb: float = 15.5
+) -> CompressionResult:
+    """
+    Awaitable version of compress_video.
+    
+    The algorithm runs on the event loop's default executor. While ffmpeg
+    works, that thread blocks in the subprocess wait (no polling) and the
+    event loop stays free for progress reporting or other encodes.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, compress_video, input_path, output_path, algorithm, target_size_mb
+    )
+
+
+async def compress_videos_async(
+    jobs: Sequence[Tuple[str, str]],
+    algorithm: Algorithm,
+    target_size_mb: float = 15.5,
+    max_concurrent: Optional[int] = None
+) -> List[CompressionResult]:
+    """
+    Compress several (input_path, output_path) pairs concurrently.
+    
+    Args:
+        jobs: (input_path, output_path) pairs
+        algorithm: Which compression algorithm to use
+        target_size_mb: Target file size in megabytes
+        max_concurrent: Encodes in flight at once (default: NVENC session
+            limit with a GPU, otherwise CPU_CONCURRENT_ENCODES)
+        
+    Returns:
+        CompressionResults in the same order as jobs
+    """
+    if max_concurrent is None:
+        max_concurrent = NVENC_SESSION_LIMIT if hw_accel() else CPU_CONCURRENT_ENCODES
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    
+    async def run(input_path: str, output_path: str) -> CompressionResult:
+        async with semaphore:
+            return await compress_video_async(
+                input_path, output_path, algorithm, target_size_mb
+            )
+    
+    return await asyncio.gather(*(run(i, o) for i, o in jobs))
 
 
 # =============================================================================
@@ -789,8 +1115,8 @@ def compress_video(
 │ Resolution          │ Up to 1080p      │ 720p             │ 640p             │
 │ Encoding Passes     │ 1-pass CRF       │ 2-pass ABR       │ 1-pass CRF       │
 │ CRF Value           │ 23               │ N/A (bitrate)    │ 28               │
-│ Preset              │ slow             │ medium           │ faster           │
-│ B-Frames            │ Yes              │ Yes (3)          │ No               │
+│ Preset              │ slow             │ medium           │ veryfast         │
+│ B-Frames            │ Yes              │ Yes (3)          │ Yes (2)          │
 │ Audio Bitrate       │ 128 kbps         │ 128 kbps         │ 96 kbps (mono)   │
 └─────────────────────┴──────────────────┴──────────────────┴──────────────────┘
 """
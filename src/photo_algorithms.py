@@ -18,12 +18,23 @@ Our Strategy:
 """
 
 import os
+import re
+import shutil
+import threading
 from enum import Enum
+from functools import lru_cache
 from dataclasses import dataclass
-from typing import Optional, Tuple
-from PIL import Image, ImageFilter, ImageEnhance, ImageOps
+from typing import Callable, List, Optional, Sequence, Tuple
+import PIL
+from PIL import Image, ImageFilter, ImageEnhance, ImageOps, ImageSequence, ImageStat
 import io
 
+# Pillow-SIMD is a drop-in build of Pillow with SSE4/AVX2 resize, filter and
+# enhance kernels; its versions carry a ".postN" suffix
+PILLOW_SIMD = '.post' in PIL.__version__
+if PILLOW_SIMD:
+    print(f"Using Pillow-SIMD {PIL.__version__}")
+
 # Try to import advanced features
 try:
     import numpy as np
@@ -31,6 +42,69 @@ try:
 except ImportError:
     NUMPY_AVAILABLE = False
 
+# jpegli (libjxl's JPEG encoder) - optional, ~15-20% smaller JPEGs at the
+# same visual quality. Used through its cjpegli CLI when on PATH.
+JPEGLI_PATH = shutil.which('cjpegli')
+
+# libvips (pyvips) - optional; with a mozjpeg build it adds trellis
+# quantization and scan optimization for Clarity Max
+try:
+    import pyvips
+    PYVIPS_AVAILABLE = True
+except (ImportError, OSError):  # OSError: binding present, libvips missing
+    pyvips = None
+    PYVIPS_AVAILABLE = False
+
+# OpenCV runs resize/sharpen/enhance on one array - optional speedup
+try:
+    import cv2
+    CV2_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    cv2 = None
+    CV2_AVAILABLE = False
+
+# Numba counts the colors for detect_image_type in one pass - optional.
+# Imported on first use: numba plus loading the compiled kernel is most of
+# this module's import time, and Quick Share never classifies images.
+_color_count_kernel = None
+_color_count_loaded = False
+_color_count_lock = threading.Lock()
+
+
+# Serial: the shared color bitmap would race under prange
+def _count_colors(arr):
+    """Number of distinct RGB colors in an (H, W, 3) uint8 array"""
+    h, w = arr.shape[0], arr.shape[1]
+    bitmap = np.zeros(1 << 18, np.uint64)  # one bit per 24-bit color
+    unique = 0
+    for i in range(h):
+        for j in range(w):
+            packed = (np.int64(arr[i, j, 0]) << 16) | (np.int64(arr[i, j, 1]) << 8) | np.int64(arr[i, j, 2])
+            bit = np.uint64(1) << np.uint64(packed & 63)
+            if not bitmap[packed >> 6] & bit:
+                bitmap[packed >> 6] |= bit
+                unique += 1
+    return unique
+
+
+def _get_color_count_kernel():
+    """Numba-compiled _count_colors, or None without numba"""
+    global _color_count_kernel, _color_count_loaded
+    if not _color_count_loaded:
+        with _color_count_lock:
+            if not _color_count_loaded and NUMPY_AVAILABLE:
+                try:
+                    from numba import njit
+                    kernel = njit(cache=True, nogil=True)(_count_colors)
+                    # Compile (or load from cache) on a read-only array,
+                    # which is what np.asarray(img) returns
+                    kernel(np.asarray(Image.new('RGB', (2, 2))))
+                    _color_count_kernel = kernel
+                except Exception:  # not installed, or failed to compile
+                    pass
+            _color_count_loaded = True
+    return _color_count_kernel
+
 
 class PhotoAlgorithm(Enum):
     """Available photo compression algorithms"""
@@ -65,29 +139,56 @@ class PhotoInfo:
     is_animated: bool
 
 
+def _photo_info(img: Image.Image, file_size: int) -> PhotoInfo:
+    """Build PhotoInfo from an opened image (header only, no pixel decode)"""
+    is_animated = getattr(img, 'n_frames', 1) > 1
+    has_transparency = img.mode in ('RGBA', 'LA', 'P') and 'transparency' in img.info
+    
+    return PhotoInfo(
+        width=img.width,
+        height=img.height,
+        format=img.format or 'UNKNOWN',
+        mode=img.mode,
+        file_size=file_size,
+        has_transparency=has_transparency,
+        is_animated=is_animated
+    )
+
+
 def analyze_photo(file_path: str) -> Optional[PhotoInfo]:
     """Analyze photo and return its properties"""
     try:
         file_size = os.path.getsize(file_path)
         
         with Image.open(file_path) as img:
-            is_animated = getattr(img, 'n_frames', 1) > 1
-            has_transparency = img.mode in ('RGBA', 'LA', 'P') and 'transparency' in img.info
-            
-            return PhotoInfo(
-                width=img.width,
-                height=img.height,
-                format=img.format or 'UNKNOWN',
-                mode=img.mode,
-                file_size=file_size,
-                has_transparency=has_transparency,
-                is_animated=is_animated
-            )
+            return _photo_info(img, file_size)
     except Exception as e:
         print(f"Error analyzing photo: {e}")
         return None
 
 
+def _open_and_info(file_path: str) -> Optional[Tuple[PhotoInfo, Image.Image]]:
+    """
+    Open an image once for both analysis and compression.
+    
+    The returned image is still lazy (pixels not decoded yet); the caller
+    owns it and should close it, e.g. with a `with` block.
+    """
+    try:
+        file_size = os.path.getsize(file_path)
+        img = Image.open(file_path)
+    except Exception as e:
+        print(f"Error analyzing photo: {e}")
+        return None
+    
+    try:
+        return _photo_info(img, file_size), img
+    except Exception as e:
+        img.close()
+        print(f"Error analyzing photo: {e}")
+        return None
+
+
 def get_optimal_dimensions(
     width: int, 
     height: int, 
@@ -99,16 +200,13 @@ def get_optimal_dimensions(
     
     if width > height:
         new_width = max_dimension
-        new_height = int(height * (max_dimension / width))
+        new_height = height * max_dimension // width
     else:
         new_height = max_dimension
-        new_width = int(width * (max_dimension / height))
+        new_width = width * max_dimension // height
     
     # Ensure dimensions are even (better for some encoders)
-    new_width = new_width if new_width % 2 == 0 else new_width + 1
-    new_height = new_height if new_height % 2 == 0 else new_height + 1
-    
-    return new_width, new_height
+    return (new_width + 1) & ~1, (new_height + 1) & ~1
 
 
 def apply_smart_sharpen(img: Image.Image, strength: float = 0.3) -> Image.Image:
@@ -131,18 +229,155 @@ def enhance_for_whatsapp(img: Image.Image, level: str = 'balanced') -> Image.Ima
         return img
     
     # Subtle contrast boost (WhatsApp flattens contrast slightly)
-    contrast_factor = {'light': 1.02, 'balanced': 1.05, 'strong': 1.08}.get(level, 1.05)
-    enhancer = ImageEnhance.Contrast(img)
-    img = enhancer.enhance(contrast_factor)
+    contrast_factor = CONTRAST_FACTORS.get(level, 1.05)
+    if img.mode in ('L', 'RGB'):
+        # Same result as ImageEnhance.Contrast, without building and
+        # blending a full-size gray image
+        mean = int(ImageStat.Stat(img.convert('L')).mean[0] + 0.5)
+        img = img.point(_contrast_lut(contrast_factor, mean) * len(img.getbands()))
+    else:
+        img = ImageEnhance.Contrast(img).enhance(contrast_factor)
     
     # Subtle saturation boost (counteract WhatsApp desaturation)
-    saturation_factor = {'light': 1.02, 'balanced': 1.05, 'strong': 1.10}.get(level, 1.05)
+    saturation_factor = SATURATION_FACTORS.get(level, 1.05)
     enhancer = ImageEnhance.Color(img)
     img = enhancer.enhance(saturation_factor)
     
     return img
 
 
+CONTRAST_FACTORS = {'light': 1.02, 'balanced': 1.05, 'strong': 1.08}
+SATURATION_FACTORS = {'light': 1.02, 'balanced': 1.05, 'strong': 1.10}
+
+
+@lru_cache(maxsize=64)
+def _contrast_lut(factor: float, mean: int) -> Tuple[int, ...]:
+    """256-entry table scaling levels around mean, as ImageEnhance.Contrast does"""
+    return tuple(
+        min(255, max(0, int(mean + factor * (v - mean)))) for v in range(256)
+    )
+
+# Per-thread scratch arrays for the OpenCV pipeline
+_scratch = threading.local()
+
+
+def _buffer(name: str, shape, dtype=None):
+    """This thread's scratch array for name, reallocated when the shape changes"""
+    dtype = dtype or np.uint8
+    buf = getattr(_scratch, name, None)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = np.empty(shape, dtype)
+        setattr(_scratch, name, buf)
+    return buf
+
+
+def _process_np(
+    img: Image.Image,
+    sharpen_strength: float,
+    enhance_level: str
+) -> Image.Image:
+    """
+    Sharpen and enhance an RGB image as one OpenCV pipeline.
+    
+    Same operations as the PIL chain (UnsharpMask radius 1 / threshold 2,
+    ImageEnhance Contrast then Color), but on a single array with reused
+    buffers instead of a new full-size image per step.
+    """
+    arr = np.asarray(img)
+    
+    # Unsharp mask: arr + amount * (arr - blur), skipping |diff| < threshold.
+    # A 3x3 binomial [1,2,1]/4 stands in for the radius-1 Gaussian: three
+    # times cheaper than the full 7-tap kernel, still ~46 dB from PIL's.
+    amount = int(50 + sharpen_strength * 100) / 100.0
+    blur = cv2.GaussianBlur(arr, (3, 3), 0, dst=_buffer('blur', arr.shape))
+    # Freshly allocated: every later step works in place on it and it is
+    # handed to PIL at the end, so it cannot be a reused scratch buffer
+    sharp = cv2.addWeighted(arr, 1 + amount, blur, -amount, 0)
+    low = cv2.absdiff(arr, blur, dst=_buffer('diff', arr.shape)) < 2
+    np.copyto(sharp, arr, where=low)
+    arr = sharp
+    
+    if enhance_level != 'none':
+        # Contrast: scale around the mean gray level, via a lookup table
+        contrast = CONTRAST_FACTORS.get(enhance_level, 1.05)
+        gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY, dst=_buffer('gray', arr.shape[:2]))
+        mean = int(cv2.mean(gray)[0] + 0.5)
+        lut = np.array(_contrast_lut(contrast, mean), np.uint8)
+        cv2.LUT(arr, lut, dst=arr)
+        
+        # Saturation: blend away from the pixel's own gray value
+        saturation = SATURATION_FACTORS.get(enhance_level, 1.05)
+        cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY, dst=gray)
+        gray3 = cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB, dst=_buffer('gray3', arr.shape))
+        cv2.addWeighted(arr, saturation, gray3, 1 - saturation, 0, dst=arr)
+    
+    return Image.fromarray(arr)
+
+
+def resize_sharpen_enhance(
+    img: Image.Image,
+    size: Tuple[int, int],
+    resample: int,
+    sharpen_strength: float,
+    enhance_level: str = 'none'
+) -> Image.Image:
+    """
+    Resize (if needed), sharpen and enhance.
+    
+    The resize stays in PIL: its filters are antialiased, which OpenCV's
+    Lanczos/cubic are not when shrinking. Sharpening and enhancement then
+    run as one OpenCV pass when available.
+    """
+    if size != img.size:
+        img = img.resize(size, resample)
+    
+    if CV2_AVAILABLE and img.mode == 'RGB':
+        return _process_np(img, sharpen_strength, enhance_level)
+    
+    img = apply_smart_sharpen(img, sharpen_strength)
+    return enhance_for_whatsapp(img, enhance_level)
+
+
+def _flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """
+    Composite an RGBA/LA/P image onto white and return it as RGB.
+    
+    The RGBA image is its own paste mask (Pillow reads the alpha band in
+    place), so no per-band images are split out for the mask.
+    """
+    if img.mode == 'P' and 'transparency' not in img.info:
+        return img.convert('RGB')  # opaque palette: nothing to composite
+    
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img, mask=img)
+    return background
+
+
+def _draft_for(img: Image.Image, max_dimension: int):
+    """
+    Let libjpeg decode a large JPEG at 1/2, 1/4 or 1/8 scale.
+    
+    The DCT-domain scale is the largest that still leaves the image at
+    least as big as the final size, so the resize filter always does the
+    last step. Must run before the pixels are loaded; no-op for other
+    formats.
+    
+    Only for compressors that don't call detect_image_type: its color
+    ratio depends on the decode scale, so a draft turns large graphics
+    into photos.
+    """
+    if img.format == 'JPEG':
+        img.draft(None, get_optimal_dimensions(img.width, img.height, max_dimension))
+
+
+# Longest side detect_image_type measures edges on; larger images are
+# subsampled for that metric
+ANALYSIS_MAX_DIM = 1024
+
+
 def detect_image_type(img: Image.Image) -> str:
     """
     Detect the type of image content for optimal processing.
@@ -158,16 +393,41 @@ def detect_image_type(img: Image.Image) -> str:
         else:
             img_rgb = img
         
-        arr = np.array(img_rgb)
-        
-        # Calculate color statistics
-        unique_colors = len(np.unique(arr.reshape(-1, 3), axis=0))
+        # Color ratio at full resolution: a palette doesn't shrink with the
+        # image, so unique colors per pixel of a smaller copy read far
+        # higher and turn large graphics into photos
+        arr = np.asarray(img_rgb)  # read-only view, no copy
         total_pixels = arr.shape[0] * arr.shape[1]
-        color_ratio = unique_colors / total_pixels
         
-        # Calculate edge density (indicates text/graphics)
-        gray = np.mean(arr, axis=2)
-        edges = np.abs(np.diff(gray, axis=0)).mean() + np.abs(np.diff(gray, axis=1)).mean()
+        count_colors = _get_color_count_kernel()
+        if count_colors is not None:
+            unique_colors = count_colors(arr)
+        else:
+            # Mark each packed 24-bit color in a bitmap, a band of rows at
+            # a time to bound the temporary arrays
+            seen = np.zeros(1 << 24, np.bool_)
+            for top in range(0, arr.shape[0], 256):
+                band = arr[top:top + 256]
+                seen[(band[..., 0].astype(np.uint32) << 16) |
+                     (band[..., 1].astype(np.uint32) << 8) | band[..., 2]] = True
+            unique_colors = int(np.count_nonzero(seen))
+        
+        # Edges on a nearest-neighbour copy capped at ANALYSIS_MAX_DIM: at
+        # this size every label on our sample set matched the
+        # full-resolution one (smaller caps inflate the neighbour
+        # differences enough to flip some)
+        size = get_optimal_dimensions(img_rgb.width, img_rgb.height, ANALYSIS_MAX_DIM)
+        if size != img_rgb.size:
+            arr = np.asarray(img_rgb.resize(size, Image.Resampling.NEAREST))
+        
+        # Edge density (indicates text/graphics). Neighbour differences
+        # are sampled on every 4th row/column - the same mean, estimated
+        # from a quarter of the pixels.
+        rows = np.mean(arr[::4], axis=2)
+        cols = np.mean(arr[:, ::4], axis=2)
+        edges = np.abs(np.diff(cols, axis=0)).mean() + np.abs(np.diff(rows, axis=1)).mean()
+        
+        color_ratio = unique_colors / total_pixels
         
         # Classify based on characteristics
         if color_ratio < 0.01 and edges > 20:
@@ -182,6 +442,227 @@ def detect_image_type(img: Image.Image) -> str:
         return 'photo'
 
 
+# =============================================================================
+# JPEG ENCODING
+# =============================================================================
+
+# PIL subsampling codes -> cjpegli --chroma_subsampling values
+_JPEGLI_SUBSAMPLING = {0: '444', 1: '422', 2: '420'}
+
+
+# IJG standard luminance quantization table, the quality-50 reference
+_IJG_LUMA_TABLE_SUM = sum((
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99
+))
+
+
+def _estimate_jpeg_quality(img: Image.Image) -> Optional[int]:
+    """Approximate IJG quality of a JPEG from its luminance table, or None"""
+    tables = getattr(img, 'quantization', None)
+    if not tables or 0 not in tables:
+        return None
+    
+    # Invert libjpeg's scaling: scale = 5000 / q below 50, 200 - 2q above
+    scale = sum(tables[0]) * 100.0 / _IJG_LUMA_TABLE_SUM
+    if scale <= 100:
+        return int(round((200 - scale) / 2))
+    return max(1, int(round(5000 / scale)))
+
+
+def _can_pass_through(
+    img: Image.Image,
+    photo_info: PhotoInfo,
+    max_dimension: int,
+    quality: int,
+    max_bytes: Optional[int] = None
+) -> bool:
+    """
+    Whether a JPEG source is already what we would produce.
+    
+    An RGB JPEG that fits the size box, is encoded at or below
+    the target quality and carries no EXIF (which a copy would keep but
+    a re-encode strips) can be copied as-is: decoding and re-encoding it
+    would only lose detail and often make it larger.
+    """
+    estimated = _estimate_jpeg_quality(img) if photo_info.format == 'JPEG' else None
+    return (
+        estimated is not None
+        and estimated <= quality
+        and photo_info.mode == 'RGB'
+        and 'exif' not in img.info
+        and max(photo_info.width, photo_info.height) <= max_dimension
+        and (not max_bytes or photo_info.file_size <= max_bytes)
+    )
+
+
+# Quality steps and floor when re-encoding to fit a max_bytes budget
+BUDGET_QUALITY_STEP = 5
+BUDGET_MIN_QUALITY = 40
+
+
+def _encode_pil(img: Image.Image, fmt: str, **params) -> bytes:
+    """Encode with PIL into memory"""
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def _encode_jpeg(
+    img: Image.Image,
+    quality: int,
+    subsampling: int,
+    progressive: bool = True
+) -> bytes:
+    """
+    Encode as JPEG with jpegli when available, otherwise PIL/libjpeg.
+    
+    jpegli keeps the baseline JPEG container (any decoder can read it) but
+    uses better adaptive quantization. It is fed an uncompressed PPM so
+    the hand-off costs no extra encode.
+    """
+    if JPEGLI_PATH and img.mode in ('RGB', 'L'):
+        import subprocess
+        import tempfile
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                ppm_path = os.path.join(tmp, 'in.ppm')
+                jpg_path = os.path.join(tmp, 'out.jpg')
+                img.save(ppm_path, 'PPM')
+                result = subprocess.run(
+                    [JPEGLI_PATH, ppm_path, jpg_path,
+                     '-q', str(quality),
+                     f'--chroma_subsampling={_JPEGLI_SUBSAMPLING.get(subsampling, "420")}',
+                     '-p', '2' if progressive else '0'],
+                    capture_output=True
+                )
+                if result.returncode == 0 and os.path.exists(jpg_path):
+                    with open(jpg_path, 'rb') as f:
+                        return f.read()
+            print(f"jpegli failed, using libjpeg: {result.stderr.decode(errors='ignore')[-200:]}")
+        except OSError as e:
+            print(f"jpegli failed, using libjpeg: {e}")
+    
+    return _encode_pil(
+        img,
+        'JPEG',
+        quality=quality,
+        optimize=True,
+        progressive=progressive,
+        subsampling=subsampling
+    )
+
+
+# mozjpeg quantization table for Clarity Max (libvips quant_table index).
+# Table 3 (ImageMagick/Robidoux) is often recommended for q>=90 4:4:4, but
+# on our samples at q86-95 it lost to the default table 0 at equal size on
+# both PSNR and SSIM (~0.5 dB on photos, several dB on screenshots), and
+# decode time only tracks file size. Kept at 0; the knob stays for tuning.
+CLARITY_QUANT_TABLE = 0
+
+
+def _encode_mozjpeg(
+    img: Image.Image,
+    quality: int,
+    subsampling: int,
+    quant_table: int = 0
+) -> bytes:
+    """
+    Encode as JPEG through libvips with mozjpeg's size optimizations.
+    
+    Trellis quantization, deringing and scan optimization cost several
+    times the encode time of plain libjpeg for 5-13% smaller files, so
+    only Clarity Max uses this. Falls back to _encode_jpeg (standard
+    tables) without pyvips.
+    """
+    if not (PYVIPS_AVAILABLE and img.mode == 'RGB'):
+        return _encode_jpeg(img, quality, subsampling)
+    
+    try:
+        vimg = pyvips.Image.new_from_memory(
+            img.tobytes(), img.width, img.height, 3, 'uchar'
+        )
+        return vimg.jpegsave_buffer(
+            Q=quality,
+            optimize_coding=True,
+            trellis_quant=True,
+            overshoot_deringing=True,
+            optimize_scans=True,
+            interlace=True,
+            subsample_mode='off' if subsampling == 0 else 'auto',
+            quant_table=quant_table
+        )
+    except pyvips.Error as e:
+        print(f"libvips JPEG save failed, using fallback: {e}")
+        return _encode_jpeg(img, quality, subsampling)
+
+
+def _write_within_budget(
+    output_path: str,
+    encode: Callable[[int], bytes],
+    quality: int,
+    max_bytes: Optional[int] = None
+) -> int:
+    """
+    Encode in memory, lowering quality until the result fits max_bytes.
+    
+    Only the accepted encode touches the disk. Past BUDGET_MIN_QUALITY the smallest
+    encode is kept even if it is still over budget.
+    
+    Returns:
+        The quality that was written
+    """
+    data = encode(quality)
+    while max_bytes and len(data) > max_bytes and quality > BUDGET_MIN_QUALITY:
+        quality = max(quality - BUDGET_QUALITY_STEP, BUDGET_MIN_QUALITY)
+        data = encode(quality)
+    
+    _write_atomic(output_path, data)
+    return quality
+
+
+def _encode_target_size(
+    encode: Callable[[int], bytes],
+    target_bytes: int,
+    min_quality: int = 55,
+    max_quality: int = 95
+) -> Tuple[int, bytes]:
+    """
+    Binary-search the highest quality whose encode fits target_bytes.
+    
+    Size grows monotonically with quality, so ~6 in-memory encodes cover
+    the whole range. If even min_quality is too big, that encode is kept.
+    
+    Returns:
+        (quality, encoded bytes)
+    """
+    best = None
+    smallest = None
+    lo, hi = min_quality, max_quality
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        data = encode(quality)
+        if len(data) <= target_bytes:
+            best = (quality, data)
+            lo = quality + 1
+        else:
+            if smallest is None or quality < smallest[0]:
+                smallest = (quality, data)
+            hi = quality - 1
+    return best or smallest
+
+
+def _write_atomic(output_path: str, data: bytes):
+    """Write to a temporary name and rename, so readers never see a partial file"""
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+
+
 # =============================================================================
 # ALGORITHM 1: CLARITY MAX
 # =============================================================================
@@ -193,7 +674,8 @@ def detect_image_type(img: Image.Image) -> str:
 def compress_clarity_max(
     input_path: str,
     output_path: str,
-    target_format: str = 'jpg'
+    target_format: str = 'jpg',
+    max_bytes: Optional[int] = None
 ) -> PhotoCompressionResult:
     """
     Algorithm 1: Clarity Max - Maximum Quality Preservation
@@ -206,20 +688,22 @@ def compress_clarity_max(
     - Progressive JPEG for better perceived loading
     - Chroma subsampling 4:4:4 for best color
     """
-    photo_info = analyze_photo(input_path)
-    if not photo_info:
+    opened = _open_and_info(input_path)
+    if not opened:
         return PhotoCompressionResult(
             success=False, output_path="", original_size=0,
             compressed_size=0, compression_ratio=0,
             algorithm_used="Clarity Max", output_format="",
             new_dimensions=(0, 0), message="Could not analyze photo"
         )
+    photo_info, img = opened
     
     try:
-        with Image.open(input_path) as img:
+        with img:
             # Handle animated images
             if photo_info.is_animated:
-                return _process_animated_gif(input_path, output_path, 'clarity_max')
+                return _process_animated_gif(input_path, output_path, 'clarity_max',
+                                             photo_info, img)
             
             # Convert to RGB if needed (for JPEG output)
             if img.mode in ('RGBA', 'P'):
@@ -228,12 +712,7 @@ def compress_clarity_max(
                 if has_alpha and target_format.lower() in ('png', 'webp'):
                     pass  # Keep alpha
                 else:
-                    # Create white background for JPEG
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
+                    img = _flatten_to_rgb(img)  # white background for JPEG
             elif img.mode != 'RGB':
                 img = img.convert('RGB')
             
@@ -246,35 +725,32 @@ def compress_clarity_max(
                 max_dimension=1280
             )
             
-            # High-quality resize using Lanczos
-            if (new_width, new_height) != (img.width, img.height):
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Apply smart sharpening (stronger for photos, lighter for graphics)
+            # High-quality resize using Lanczos, smart sharpening (stronger
+            # for photos, lighter for graphics) and WhatsApp-optimized
+            # enhancements
             sharpen_strength = 0.4 if img_type == 'photo' else 0.2
-            img = apply_smart_sharpen(img, sharpen_strength)
-            
-            # Apply WhatsApp-optimized enhancements
-            if img_type in ('photo', 'graphic'):
-                img = enhance_for_whatsapp(img, 'balanced')
+            img = resize_sharpen_enhance(
+                img, (new_width, new_height), Image.Resampling.LANCZOS,
+                sharpen_strength,
+                'balanced' if img_type in ('photo', 'graphic') else 'none'
+            )
             
             # Determine output format
             if target_format.lower() in ('jpg', 'jpeg'):
                 output_path = output_path.rsplit('.', 1)[0] + '.jpg'
-                img.save(
-                    output_path,
-                    'JPEG',
-                    quality=92,
-                    optimize=True,
-                    progressive=True,
-                    subsampling=0  # 4:4:4 - best color quality
-                )
+                # 4:4:4 - best color quality
+                _write_within_budget(output_path,
+                                     lambda q: _encode_mozjpeg(img, q, subsampling=0,
+                                                               quant_table=CLARITY_QUANT_TABLE),
+                                     92, max_bytes)
             elif target_format.lower() == 'png':
                 output_path = output_path.rsplit('.', 1)[0] + '.png'
                 img.save(output_path, 'PNG', optimize=True)
             else:  # WebP
                 output_path = output_path.rsplit('.', 1)[0] + '.webp'
-                img.save(output_path, 'WEBP', quality=92, method=6)
+                _write_within_budget(output_path,
+                                     lambda q: _encode_pil(img, 'WEBP', quality=q, method=6),
+                                     92, max_bytes)
             
             compressed_size = os.path.getsize(output_path)
             compression_ratio = (1 - compressed_size / photo_info.file_size) * 100
@@ -311,7 +787,9 @@ def compress_clarity_max(
 def compress_balanced_pro(
     input_path: str,
     output_path: str,
-    target_format: str = 'jpg'
+    target_format: str = 'jpg',
+    max_bytes: Optional[int] = None,
+    target_bytes: Optional[int] = None
 ) -> PhotoCompressionResult:
     """
     Algorithm 2: Balanced Pro - Smart Quality/Size Balance
@@ -322,29 +800,28 @@ def compress_balanced_pro(
     - Moderate sharpening
     - Chroma subsampling 4:2:2 for balance
     - Content-aware enhancement
+    - Optional target_bytes: quality is searched (55-95) to fill that size
     """
-    photo_info = analyze_photo(input_path)
-    if not photo_info:
+    opened = _open_and_info(input_path)
+    if not opened:
         return PhotoCompressionResult(
             success=False, output_path="", original_size=0,
             compressed_size=0, compression_ratio=0,
             algorithm_used="Balanced Pro", output_format="",
             new_dimensions=(0, 0), message="Could not analyze photo"
         )
+    photo_info, img = opened
     
     try:
-        with Image.open(input_path) as img:
+        with img:
             # Handle animated images
             if photo_info.is_animated:
-                return _process_animated_gif(input_path, output_path, 'balanced_pro')
+                return _process_animated_gif(input_path, output_path, 'balanced_pro',
+                                             photo_info, img)
             
             # Convert to RGB
             if img.mode in ('RGBA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
+                img = _flatten_to_rgb(img)
             elif img.mode != 'RGB':
                 img = img.convert('RGB')
             
@@ -357,15 +834,13 @@ def compress_balanced_pro(
                 max_dimension=1080
             )
             
-            # Resize
-            if (new_width, new_height) != (img.width, img.height):
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Moderate sharpening
-            img = apply_smart_sharpen(img, 0.25)
-            
-            # Light enhancement
-            img = enhance_for_whatsapp(img, 'light')
+            # Resize (bicubic is close to Lanczos at these ratios and is
+            # followed by sharpening, with a smaller, faster kernel),
+            # moderate sharpening, light enhancement
+            img = resize_sharpen_enhance(
+                img, (new_width, new_height), Image.Resampling.BICUBIC,
+                0.25, 'light'
+            )
             
             # Adaptive quality based on content
             if img_type == 'screenshot':
@@ -378,17 +853,18 @@ def compress_balanced_pro(
             # Save
             if target_format.lower() in ('jpg', 'jpeg'):
                 output_path = output_path.rsplit('.', 1)[0] + '.jpg'
-                img.save(
-                    output_path,
-                    'JPEG',
-                    quality=quality,
-                    optimize=True,
-                    progressive=True,
-                    subsampling=1  # 4:2:2
-                )
+                encode = lambda q: _encode_jpeg(img, q, subsampling=1)  # 4:2:2
             else:
                 output_path = output_path.rsplit('.', 1)[0] + '.webp'
-                img.save(output_path, 'WEBP', quality=quality, method=4)
+                encode = lambda q: _encode_pil(img, 'WEBP', quality=q, method=4)
+            
+            if target_bytes:
+                # Size-targeted: replaces the content-based quality
+                budget = min(target_bytes, max_bytes) if max_bytes else target_bytes
+                quality, data = _encode_target_size(encode, budget)
+                _write_atomic(output_path, data)
+            else:
+                quality = _write_within_budget(output_path, encode, quality, max_bytes)
             
             compressed_size = os.path.getsize(output_path)
             compression_ratio = (1 - compressed_size / photo_info.file_size) * 100
@@ -425,7 +901,8 @@ def compress_balanced_pro(
 def compress_quick_share(
     input_path: str,
     output_path: str,
-    target_format: str = 'jpg'
+    target_format: str = 'jpg',
+    max_bytes: Optional[int] = None
 ) -> PhotoCompressionResult:
     """
     Algorithm 3: Quick Share - Maximum Compression
@@ -437,29 +914,46 @@ def compress_quick_share(
     - Fast processing
     - Smallest file sizes
     """
-    photo_info = analyze_photo(input_path)
-    if not photo_info:
+    opened = _open_and_info(input_path)
+    if not opened:
         return PhotoCompressionResult(
             success=False, output_path="", original_size=0,
             compressed_size=0, compression_ratio=0,
             algorithm_used="Quick Share", output_format="",
             new_dimensions=(0, 0), message="Could not analyze photo"
         )
+    photo_info, img = opened
     
     try:
-        with Image.open(input_path) as img:
+        with img:
             # Handle animated images
             if photo_info.is_animated:
-                return _process_animated_gif(input_path, output_path, 'quick_share')
+                return _process_animated_gif(input_path, output_path, 'quick_share',
+                                             photo_info, img)
+            
+            # Already a small, low-quality JPEG: copy it instead of
+            # spending a decode and encode on making it worse
+            if _can_pass_through(img, photo_info, 720, 70, max_bytes):
+                output_path = output_path.rsplit('.', 1)[0] + '.jpg'
+                shutil.copyfile(input_path, output_path)
+                return PhotoCompressionResult(
+                    success=True,
+                    output_path=output_path,
+                    original_size=photo_info.file_size,
+                    compressed_size=photo_info.file_size,
+                    compression_ratio=0,
+                    algorithm_used="Quick Share",
+                    output_format="JPG",
+                    new_dimensions=(photo_info.width, photo_info.height),
+                    message="Already optimized. Copied without re-encoding"
+                )
+            
+            _draft_for(img, 720)
             
             # Convert to RGB
             if img.mode != 'RGB':
                 if img.mode in ('RGBA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
+                    img = _flatten_to_rgb(img)
                 else:
                     img = img.convert('RGB')
             
@@ -469,23 +963,16 @@ def compress_quick_share(
                 max_dimension=720
             )
             
-            # Fast resize
-            if (new_width, new_height) != (img.width, img.height):
-                img = img.resize((new_width, new_height), Image.Resampling.BILINEAR)
-            
-            # Minimal sharpening
-            img = apply_smart_sharpen(img, 0.15)
+            # Fast resize, minimal sharpening
+            img = resize_sharpen_enhance(
+                img, (new_width, new_height), Image.Resampling.BILINEAR, 0.15
+            )
             
             # Save with aggressive compression
             output_path = output_path.rsplit('.', 1)[0] + '.jpg'
-            img.save(
-                output_path,
-                'JPEG',
-                quality=70,
-                optimize=True,
-                progressive=True,
-                subsampling=2  # 4:2:0 - maximum compression
-            )
+            _write_within_budget(output_path,
+                                 lambda q: _encode_jpeg(img, q, subsampling=2),  # 4:2:0 - maximum compression
+                                 70, max_bytes)
             
             compressed_size = os.path.getsize(output_path)
             compression_ratio = (1 - compressed_size / photo_info.file_size) * 100
@@ -518,16 +1005,21 @@ def compress_quick_share(
 def _process_animated_gif(
     input_path: str,
     output_path: str,
-    algorithm: str
+    algorithm: str,
+    photo_info: Optional[PhotoInfo] = None,
+    img: Optional[Image.Image] = None
 ) -> PhotoCompressionResult:
     """
     Process animated GIFs with optimization.
     Reduces colors, optimizes frames, and resizes.
+    
+    Callers that already opened the file pass its PhotoInfo and image.
     """
-    photo_info = analyze_photo(input_path)
+    if photo_info is None:
+        photo_info = analyze_photo(input_path)
     
     try:
-        with Image.open(input_path) as img:
+        with (img if img is not None else Image.open(input_path)) as img:
             frames = []
             durations = []
             
@@ -548,23 +1040,26 @@ def _process_animated_gif(
                 max_dimension=max_dim
             )
             
-            # Process each frame
-            try:
-                while True:
-                    frame = img.copy()
-                    
-                    # Resize frame
-                    frame = frame.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    # Reduce colors
+            # Process each frame. Median cut runs once on the first frame;
+            # later frames are mapped onto that palette, which is much
+            # cheaper and lets every frame share one global palette.
+            master_palette = None
+            for frame in ImageSequence.Iterator(img):
+                durations.append(frame.info.get('duration', 100))
+                
+                # Resize frame
+                frame = frame.convert('RGB').resize((new_width, new_height),
+                                                    Image.Resampling.LANCZOS)
+                
+                # Reduce colors
+                if master_palette is None:
                     frame = frame.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
-                    
-                    frames.append(frame)
-                    durations.append(img.info.get('duration', 100))
-                    
-                    img.seek(img.tell() + 1)
-            except EOFError:
-                pass
+                    master_palette = frame
+                else:
+                    frame = frame.quantize(palette=master_palette,
+                                           dither=Image.Dither.FLOYDSTEINBERG)
+                
+                frames.append(frame)
             
             # Save optimized GIF
             output_path = output_path.rsplit('.', 1)[0] + '.gif'
@@ -617,7 +1112,8 @@ def compress_photo(
     input_path: str,
     output_path: str,
     algorithm: PhotoAlgorithm = PhotoAlgorithm.BALANCED_PRO,
-    target_format: str = 'jpg'
+    target_format: str = 'jpg',
+    max_bytes: Optional[int] = None
 ) -> PhotoCompressionResult:
     """
     Main photo compression function.
@@ -627,18 +1123,67 @@ def compress_photo(
         output_path: Path for compressed output
         algorithm: Compression algorithm to use
         target_format: Output format (jpg, png, webp, gif)
+        max_bytes: Optional size cap; JPEG/WebP quality is lowered to fit
     
     Returns:
         PhotoCompressionResult with compression details
     """
     if algorithm == PhotoAlgorithm.CLARITY_MAX:
-        return compress_clarity_max(input_path, output_path, target_format)
+        return compress_clarity_max(input_path, output_path, target_format, max_bytes)
     elif algorithm == PhotoAlgorithm.BALANCED_PRO:
-        return compress_balanced_pro(input_path, output_path, target_format)
+        return compress_balanced_pro(input_path, output_path, target_format, max_bytes)
     elif algorithm == PhotoAlgorithm.QUICK_SHARE:
-        return compress_quick_share(input_path, output_path, target_format)
+        return compress_quick_share(input_path, output_path, target_format, max_bytes)
     else:
-        return compress_balanced_pro(input_path, output_path, target_format)
+        return compress_balanced_pro(input_path, output_path, target_format, max_bytes)
+
+
+def _init_batch_worker():
+    """One OpenCV thread per worker process - the pool already fills the cores"""
+    if CV2_AVAILABLE:
+        cv2.setNumThreads(1)
+
+
+def _compress_photo_job(
+    job: Tuple[str, str, PhotoAlgorithm, str, Optional[int]]
+) -> PhotoCompressionResult:
+    """Picklable compress_photo entry point for the batch worker pool"""
+    return compress_photo(*job)
+
+
+def compress_photos_batch(
+    jobs: Sequence[Tuple[str, str]],
+    algorithm: PhotoAlgorithm = PhotoAlgorithm.BALANCED_PRO,
+    target_format: str = 'jpg',
+    max_workers: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> List[PhotoCompressionResult]:
+    """
+    Compress several (input_path, output_path) pairs in parallel.
+    
+    Decoding, filtering and JPEG encoding are CPU-bound, so each photo runs
+    in its own worker process rather than a thread.
+    
+    Args:
+        jobs: (input_path, output_path) pairs
+        algorithm: Compression algorithm to use
+        target_format: Output format (jpg, png, webp, gif)
+        max_workers: Worker processes (default: CPU count)
+        max_bytes: Optional per-photo size cap
+    
+    Returns:
+        PhotoCompressionResults in the same order as jobs
+    """
+    tasks = [(i, o, algorithm, target_format, max_bytes) for i, o in jobs]
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    
+    if workers <= 1:
+        return [_compress_photo_job(task) for task in tasks]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as pool:
+        return list(pool.map(_compress_photo_job, tasks))
 
 
 # =============================================================================
@@ -660,50 +1205,29 @@ def video_to_gif(
     try:
         import subprocess
         
-        # Get video info
-        probe_cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_format', '-show_streams', input_path
-        ]
-        result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception("Could not probe video")
-        
-        import json
-        info = json.loads(result.stdout)
-        
-        original_size = int(info['format'].get('size', 0))
-        duration = float(info['format'].get('duration', 0))
-        
-        # Limit duration
-        use_duration = min(duration, max_duration)
+        # No ffprobe pass: -t caps the clip and ffmpeg stops at EOF for
+        # shorter videos; the real duration is read from its log below
+        original_size = os.path.getsize(input_path)
+        use_duration = max_duration
         
         output_path = output_path.rsplit('.', 1)[0] + '.gif'
         
-        # Two-pass GIF creation for better quality
-        palette_path = output_path + '_palette.png'
-        
-        # Generate palette
-        palette_cmd = [
-            'ffmpeg', '-y', '-t', str(use_duration), '-i', input_path,
-            '-vf', f'fps={fps},scale={max_width}:-1:flags=lanczos,palettegen=stats_mode=diff',
-            palette_path
-        ]
-        subprocess.run(palette_cmd, capture_output=True)
-        
-        # Generate GIF using palette
+        # Palette generation and mapping in one filter graph - the palette
+        # stays in memory and the input is only decoded once
         gif_cmd = [
             'ffmpeg', '-y', '-t', str(use_duration), '-i', input_path,
-            '-i', palette_path,
-            '-lavfi', f'fps={fps},scale={max_width}:-1:flags=lanczos[x];[x][1:v]paletteuse=dither=bayer:bayer_scale=5',
+            '-filter_complex',
+            f'[0:v]fps={fps},scale={max_width}:-1:flags=lanczos,split[a][b];'
+            f'[a]palettegen=stats_mode=diff[p];'
+            f'[b][p]paletteuse=dither=bayer:bayer_scale=5',
             output_path
         ]
-        subprocess.run(gif_cmd, capture_output=True)
+        result = subprocess.run(gif_cmd, capture_output=True, text=True)
         
-        # Cleanup palette
-        if os.path.exists(palette_path):
-            os.remove(palette_path)
+        match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', result.stderr)
+        if match:
+            h, m, sec = match.groups()
+            use_duration = min(int(h) * 3600 + int(m) * 60 + float(sec), max_duration)
         
         if not os.path.exists(output_path):
             raise Exception("GIF creation failed")
@@ -8,10 +8,29 @@ Splits videos into 30-second or 60-second segments for WhatsApp status uploads.
 import ffmpeg
 import os
 import math
-from typing import List, Tuple
+import bisect
+import pickle
+import shutil
+import atexit
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
 
 
+# ffmpeg threads for a re-encoding split; 0 = ffmpeg's automatic choice
+FFMPEG_THREADS_PER_INVOCATION = int(os.environ.get('MEDIAPRESS_FFMPEG_THREADS_PER_INVOCATION', 0))
+
+# Minimum threads per parallel segment compression (x264 and frame
+# analysis); split_and_compress runs at most cpu_count // this many workers
+SEGMENT_WORKER_THREADS = int(os.environ.get('MEDIAPRESS_SEGMENT_WORKER_THREADS', 4))
+
+# Deletes temp segment folders off the request path; drained at exit
+_cleanup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='splitter-gc')
+atexit.register(_cleanup_executor.shutdown, wait=True)
+
+
 @dataclass
 class SplitResult:
     """Result of video splitting operation"""
@@ -22,17 +41,224 @@ class SplitResult:
     message: str
 
 
+def get_probe(input_path: str) -> dict:
+    """
+    ffprobe output for a file, memoized by path, mtime and size.
+    
+    Splitting and compression probe the same upload; sharing this cache
+    means one ffprobe per file version instead of one per caller.
+    """
+    abs_path = os.path.abspath(input_path)
+    try:
+        st = os.stat(abs_path)
+        key = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None  # let ffprobe report the error
+    return _probe_cached(abs_path, key)
+
+
+@lru_cache(maxsize=64)
+def _probe_cached(input_path: str, key: Optional[Tuple[int, int]]) -> dict:
+    """ffprobe a file - key is part of the cache key only"""
+    return ffmpeg.probe(input_path)
+
+
 def get_video_duration(input_path: str) -> float:
     """Get video duration in seconds"""
-    probe = ffmpeg.probe(input_path)
-    return float(probe['format']['duration'])
+    return float(get_probe(input_path)['format']['duration'])
+
+
+def get_keyframe_times(input_path: str) -> List[float]:
+    """
+    Sorted video keyframe timestamps in seconds from the start of the file.
+    
+    Memoized like get_probe. Returns an empty list if the keyframes can't
+    be probed.
+    """
+    abs_path = os.path.abspath(input_path)
+    try:
+        st = os.stat(abs_path)
+        key = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return []
+    return list(_keyframes_cached(abs_path, key))
+
+
+@lru_cache(maxsize=64)
+def _keyframes_cached(input_path: str, key: Tuple[int, int]) -> Tuple[float, ...]:
+    """ffprobe keyframe times - key is part of the cache key only"""
+    try:
+        # Keyframe flags on the demuxed packets: nothing is decoded
+        probe = ffmpeg.probe(
+            input_path,
+            select_streams='v:0',
+            show_entries='packet=pts_time,flags:format=start_time'
+        )
+        start = float(probe.get('format', {}).get('start_time', 0))
+    except (ffmpeg.Error, ValueError):
+        return ()
+    
+    times = set()
+    for packet in probe.get('packets', []):
+        ts = packet.get('pts_time')
+        if 'K' in packet.get('flags', '') and ts not in (None, 'N/A'):
+            times.add(float(ts) - start)
+    # Packets come in decode order
+    return tuple(sorted(times))
+
+
+def _snap_to_keyframes(
+    keyframes: List[float],
+    total_duration: float,
+    segment_duration: int
+) -> Optional[List[float]]:
+    """
+    Keyframe cut times that keep every part within segment_duration.
+    
+    Stream copy can only cut on a keyframe, so each cut is the last
+    keyframe at most segment_duration after the previous one - parts run
+    up to a GOP short, never over (WhatsApp rejects longer statuses).
+    Returns None if some stretch has no keyframe to cut at.
+    """
+    cuts = []
+    prev = 0.0
+    while total_duration - prev > segment_duration:
+        # 1 ms slack for keyframes that sit on the boundary itself
+        i = bisect.bisect_right(keyframes, prev + segment_duration + 0.001) - 1
+        if i < 0 or keyframes[i] <= prev:
+            return None
+        prev = keyframes[i]
+        cuts.append(prev)
+    return cuts
+
+
+def _run_segment_muxer(
+    input_path: str,
+    pattern: str,
+    list_path: str,
+    segment_duration: int,
+    reencode: bool = False,
+    segment_times: Optional[List[float]] = None,
+    crf: int = 18,
+    preset: str = 'fast'
+):
+    """
+    Split input_path into numbered files in one ffmpeg pass.
+    
+    The segment muxer cuts a single demux of the input, so N segments cost
+    one process and one container open instead of N. With stream copy it
+    cuts at segment_times (keyframes) if given, else on the first keyframe
+    after each boundary; the re-encode fallback forces keyframes on the
+    boundaries instead.
+    """
+    stream = ffmpeg.input(input_path)
+    
+    if reencode:
+        codec = {
+            'c:v': 'libx264',
+            'crf': crf,  # 18 = high quality re-encode
+            'preset': preset,
+            'force_key_frames': f'expr:gte(t,n_forced*{segment_duration})',
+            # B-frame reordering puts forced keyframes a hair past the
+            # boundary; without slack the muxer skips to the next one
+            'segment_time_delta': 0.05,
+            'c:a': 'aac',
+            'b:a': '128k',
+            'threads': FFMPEG_THREADS_PER_INVOCATION
+        }
+    else:
+        codec = {'c': 'copy'}  # Stream copy (fast, no quality loss)
+    
+    if segment_times and not reencode:
+        cuts = {
+            'segment_times': ','.join(f'{t:.3f}' for t in segment_times),
+            # Slack for rounding and decoder delay, so a cut can't land a
+            # hair past its keyframe and slip to the next one
+            'segment_time_delta': 0.05
+        }
+    else:
+        cuts = {'segment_time': segment_duration}
+    
+    output = ffmpeg.output(
+        stream,
+        pattern,
+        f='segment',
+        **cuts,
+        segment_start_number=1,
+        segment_list=list_path,
+        segment_list_type='csv',
+        reset_timestamps=1,
+        segment_format_options='movflags=+faststart',  # Progressive download
+        avoid_negative_ts='make_zero',  # Fix timestamp issues
+        **codec
+    )
+    
+    # Only errors reach stderr: still captured for ffmpeg.Error, but a
+    # successful split no longer pipes ffmpeg's banner and progress log
+    output = output.global_args('-hide_banner', '-nostats', '-loglevel', 'error')
+    
+    ffmpeg.run(output, overwrite_output=True, capture_stderr=True)
+
+
+def _read_segment_list(list_path: str, output_dir: str) -> List[Tuple[str, float]]:
+    """(path, duration) per segment from the muxer's CSV segment list"""
+    segments = []
+    with open(list_path) as f:
+        for line in f:
+            name, start, end = line.strip().rsplit(',', 2)
+            segments.append((os.path.join(output_dir, name), float(end) - float(start)))
+    return segments
+
+
+def _parts_fit(list_path: str, segment_duration: int) -> bool:
+    """
+    Check that no part the muxer wrote runs over segment_duration.
+    
+    Deletes the parts if one does, so a re-encode into the same pattern
+    can't leave stale extras behind.
+    """
+    parts = _read_segment_list(list_path, os.path.dirname(list_path))
+    # 0.1 s slack for container rounding
+    if all(duration <= segment_duration + 0.1 for _, duration in parts):
+        return True
+    for path, _ in parts:
+        os.remove(path)
+    return False
+
+
+def _mux_segments(input_path: str, output_dir: str, output_prefix: str, run) -> List[str]:
+    """
+    Run run(pattern, list_path) to write numbered parts, return their paths.
+    
+    Removes the segment list afterwards and drops a very short final part
+    (less than 2 seconds).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    
+    pattern = os.path.join(output_dir, f"{output_prefix}_part%02d.mp4")
+    list_path = os.path.join(output_dir, f"{output_prefix}_segments.csv")
+    
+    try:
+        run(pattern, list_path)
+        parts = _read_segment_list(list_path, output_dir)
+    finally:
+        try:
+            os.unlink(list_path)
+        except FileNotFoundError:
+            pass  # Muxer failed before writing it
+    
+    if len(parts) > 1 and parts[-1][1] < 2:
+        os.remove(parts.pop()[0])
+    
+    return [path for path, _ in parts]
 
 
 def split_video(
     input_path: str,
     output_dir: str,
     segment_duration: int = 30,
-    output_prefix: str = "segment"
+    output_prefix: str = "segment",
+    total_duration: Optional[float] = None
 ) -> SplitResult:
     """
     Split a video into segments of specified duration.
@@ -45,13 +271,16 @@ def split_video(
         output_dir: Directory for output segments
         segment_duration: Duration of each segment in seconds (30 or 60)
         output_prefix: Prefix for output filenames
+        total_duration: Duration in seconds if the caller already probed
+            the file; probed here otherwise
         
     Returns:
         SplitResult with list of segment paths and metadata
     """
     try:
         # Get video duration
-        total_duration = get_video_duration(input_path)
+        if total_duration is None:
+            total_duration = get_video_duration(input_path)
         
         # Calculate number of segments
         num_segments = math.ceil(total_duration / segment_duration)
@@ -66,59 +295,40 @@ def split_video(
                 message="Video is shorter than segment duration. No splitting needed."
             )
         
-        # Ensure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
+        # Cut on keyframes so stream copy works on any GOP layout. Known
+        # keyframes with no valid cut (a GOP longer than a segment) mean
+        # only a re-encode can stay within segment_duration.
+        keyframes = get_keyframe_times(input_path)
+        segment_times = (
+            _snap_to_keyframes(keyframes, total_duration, segment_duration)
+            if keyframes else None
+        )
         
-        segments = []
+        def run(pattern, list_path):
+            # A failed copy goes straight to the re-encode: another copy
+            # pass can only cut on the same keyframes
+            if segment_times:
+                try:
+                    _run_segment_muxer(input_path, pattern, list_path, segment_duration,
+                                       segment_times=segment_times)
+                    if _parts_fit(list_path, segment_duration):
+                        return
+                except ffmpeg.Error:
+                    pass
+            elif not keyframes:
+                # Without known keyframes the muxer cuts on the first one
+                # after each boundary, which overshoots on long GOPs
+                try:
+                    _run_segment_muxer(input_path, pattern, list_path, segment_duration)
+                    if _parts_fit(list_path, segment_duration):
+                        return
+                except ffmpeg.Error:
+                    pass
+            # Last resort: re-encode with keyframes forced on the boundaries
+            _run_segment_muxer(input_path, pattern, list_path, segment_duration,
+                               reencode=True)
         
-        for i in range(num_segments):
-            start_time = i * segment_duration
-            
-            # Calculate actual duration for this segment
-            remaining = total_duration - start_time
-            actual_duration = min(segment_duration, remaining)
-            
-            # Skip very short final segments (less than 2 seconds)
-            if actual_duration < 2 and i > 0:
-                continue
-            
-            output_path = os.path.join(
-                output_dir, 
-                f"{output_prefix}_part{i+1:02d}.mp4"
-            )
-            
-            try:
-                # Use stream copy for fast splitting (no re-encoding)
-                stream = ffmpeg.input(input_path, ss=start_time, t=actual_duration)
-                
-                output = ffmpeg.output(
-                    stream,
-                    output_path,
-                    c='copy',              # Stream copy (fast, no quality loss)
-                    movflags='+faststart', # Enable progressive download
-                    avoid_negative_ts='make_zero'  # Fix timestamp issues
-                )
-                
-                ffmpeg.run(output, overwrite_output=True, capture_stderr=True)
-                segments.append(output_path)
-                
-            except ffmpeg.Error:
-                # If stream copy fails, try with re-encoding
-                stream = ffmpeg.input(input_path, ss=start_time, t=actual_duration)
-                
-                output = ffmpeg.output(
-                    stream,
-                    output_path,
-                    c_v='libx264',
-                    crf=18,  # High quality re-encode
-                    preset='fast',
-                    c_a='aac',
-                    b_a='128k',
-                    movflags='+faststart'
-                )
-                
-                ffmpeg.run(output, overwrite_output=True, capture_stderr=True)
-                segments.append(output_path)
+        segments = _mux_segments(input_path, output_dir, output_prefix, run)
         
         return SplitResult(
             success=True,
@@ -146,12 +356,32 @@ def split_video(
         )
 
 
+def _init_segment_worker(threads: int):
+    """Cap encoder and analyzer threads in a segment worker process"""
+    from . import algorithms, ml_analyzer
+    algorithms.ENCODER_THREADS = threads
+    ml_analyzer.ANALYZER_THREADS = threads
+
+
+def _remove_later(path: str):
+    """Delete a directory tree on the cleanup thread"""
+    # Move it aside first so a new split into the same folder can't
+    # race the pending delete
+    doomed = f"{path}.deleting-{uuid.uuid4().hex}"
+    try:
+        os.rename(path, doomed)
+    except OSError:
+        doomed = path
+    _cleanup_executor.submit(shutil.rmtree, doomed, ignore_errors=True)
+
+
 def split_and_compress(
     input_path: str,
     output_dir: str,
     segment_duration: int,
     compress_func,
-    output_prefix: str = "compressed"
+    output_prefix: str = "compressed",
+    total_duration: Optional[float] = None
 ) -> Tuple[SplitResult, List]:
     """
     Split video and compress each segment.
@@ -163,8 +393,11 @@ def split_and_compress(
         input_path: Path to input video file
         output_dir: Directory for output
         segment_duration: Duration of each segment (30 or 60)
-        compress_func: Compression function to apply to each segment
+        compress_func: Compression function to apply to each segment,
+            called as compress_func(segment_path, output_path). Module-level
+            functions (or partials of them) run in worker processes.
         output_prefix: Prefix for output filenames
+        total_duration: Duration in seconds if already known (see split_video)
         
     Returns:
         Tuple of (SplitResult, list of CompressionResults)
@@ -175,38 +408,55 @@ def split_and_compress(
         input_path, 
         split_dir, 
         segment_duration,
-        "temp_segment"
+        "temp_segment",
+        total_duration=total_duration
     )
     
     if not split_result.success:
         return split_result, []
     
-    # Compress each segment
-    compression_results = []
-    compressed_segments = []
+    compressed_paths = [
+        os.path.join(output_dir, f"{output_prefix}_part{i+1:02d}.mp4")
+        for i in range(len(split_result.segments))
+    ]
     
-    for i, segment_path in enumerate(split_result.segments):
-        compressed_path = os.path.join(
-            output_dir,
-            f"{output_prefix}_part{i+1:02d}.mp4"
-        )
-        
-        result = compress_func(segment_path, compressed_path)
-        compression_results.append(result)
-        
-        if result.success:
-            compressed_segments.append(compressed_path)
-        
-        # Clean up temporary segment
-        if os.path.exists(segment_path):
-            os.remove(segment_path)
+    # Compress the segments in parallel worker processes (encoding is
+    # CPU-bound). Each worker's encoder and analyzer threads are capped at
+    # cpu_count // workers, so the pool as a whole stays near cpu_count.
+    # Workers receive compress_func by pickled reference; a lambda or
+    # closure can't be sent, and its threads can't be capped in-process,
+    # so those segments - like any split too small for two workers - are
+    # compressed one after another, each encode using every core.
+    cpus = os.cpu_count() or 1
+    workers = min(len(compressed_paths), cpus // max(1, SEGMENT_WORKER_THREADS))
+    try:
+        pickle.dumps(compress_func)
+    except Exception:
+        workers = 1
     
-    # Clean up temp directory
-    if os.path.exists(split_dir):
-        try:
-            os.rmdir(split_dir)
-        except:
-            pass
+    if workers > 1:
+        threads = cpus // workers
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_segment_worker,
+                                 initargs=(threads,)) as pool:
+            compression_results = list(pool.map(
+                compress_func, split_result.segments, compressed_paths
+            ))
+    else:
+        compression_results = [
+            compress_func(segment, path)
+            for segment, path in zip(split_result.segments, compressed_paths)
+        ]
+    
+    compressed_segments = [
+        path for path, result in zip(compressed_paths, compression_results)
+        if result.success
+    ]
+    
+    # Remove the temporary segments once every worker is done, in the
+    # background. Only split_dir is removed: a video too short to split
+    # comes back as its own input path, which must survive.
+    _remove_later(split_dir)
     
     # Update split result with compressed segments
     final_result = SplitResult(
@@ -218,3 +468,63 @@ def split_and_compress(
     )
     
     return final_result, compression_results
+
+
+def split_and_encode(
+    input_path: str,
+    output_dir: str,
+    segment_duration: int,
+    crf: int = 23,
+    preset: str = 'fast',
+    output_prefix: str = "compressed"
+) -> SplitResult:
+    """
+    Encode a video to H.264 and split it into segments in one ffmpeg pass.
+    
+    Where split_and_compress starts an encoder per segment, this keeps one
+    libx264 context for the whole video and lets the segment muxer cut the
+    output on forced keyframes. Use it when every segment gets the same
+    CRF/preset; use split_and_compress for per-segment compress functions
+    such as the size-targeting algorithms.
+    
+    Args:
+        input_path: Path to input video file
+        output_dir: Directory for output segments
+        segment_duration: Duration of each segment (30 or 60)
+        crf: x264 constant rate factor
+        preset: x264 preset
+        output_prefix: Prefix for output filenames
+        
+    Returns:
+        SplitResult with list of segment paths and metadata
+    """
+    def run(pattern, list_path):
+        _run_segment_muxer(input_path, pattern, list_path, segment_duration,
+                           reencode=True, crf=crf, preset=preset)
+    
+    try:
+        segments = _mux_segments(input_path, output_dir, output_prefix, run)
+    except ffmpeg.Error as e:
+        return SplitResult(
+            success=False,
+            segments=[],
+            total_segments=0,
+            segment_duration=segment_duration,
+            message=f"Encode failed: {e.stderr.decode() if e.stderr else str(e)}"
+        )
+    except Exception as e:
+        return SplitResult(
+            success=False,
+            segments=[],
+            total_segments=0,
+            segment_duration=segment_duration,
+            message=f"Encode failed: {str(e)}"
+        )
+    
+    return SplitResult(
+        success=True,
+        segments=segments,
+        total_segments=len(segments),
+        segment_duration=segment_duration,
+        message=f"Encoded and split {len(segments)} segments."
+    )
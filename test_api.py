@@ -5,14 +5,44 @@ MediaPress API Test Suite
 Tests all API endpoints for correctness.
 """
 
-import requests
+import asyncio
+import httpx
 import os
 import sys
 import json
 import time
 
+# orjson parses responses faster when installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 BASE_URL = "http://127.0.0.1:5001/api/v1"
 
+# Requests in flight at once; matches the Waitress thread pool
+# (THREADS in videopress_service.py)
+MAX_CONCURRENT_REQUESTS = 8
+
+# Where to look for real media to upload
+TEST_VIDEO_DIRS = [
+    "/Users/mac/Desktop/github/video-compressor/uploads",
+    "/Users/mac/Movies"
+]
+TEST_PHOTO_DIRS = [
+    "/Users/mac/Desktop/github/video-compressor/uploads",
+    "/Users/mac/Pictures",
+    "/Users/mac/Desktop"
+]
+
 # Colors for terminal output
 GREEN = '\033[92m'
 RED = '\033[91m'
@@ -34,39 +64,82 @@ def log_section(msg):
     print(f"{YELLOW}{msg}{RESET}")
     print(f"{YELLOW}{'='*60}{RESET}")
 
+def find_one(dirs, extensions, max_depth=2):
+    """First file under dirs ending in one of extensions, or None.
+    
+    Test assets sit near the top of these folders, so the scan stops at
+    max_depth levels and at the first match. Hidden directories are skipped.
+    """
+    for root in dirs:
+        pending = [(root, 1)]
+        while pending:
+            path, depth = pending.pop(0)
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                # Name check first - is_file() may need a stat, the name doesn't
+                if entry.name.lower().endswith(extensions) and entry.is_file(follow_symlinks=False):
+                    return entry.path
+            if depth < max_depth:
+                pending.extend(
+                    (entry.path, depth + 1) for entry in entries
+                    if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False)
+                )
+    return None
+
 class APITester:
     def __init__(self):
-        self.session = requests.Session()
+        # One pooled client for the whole run so every test reuses the
+        # same keep-alive connections
+        self.client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            timeout=httpx.Timeout(60, read=None)  # Compression can run long
+        )
         self.passed = 0
         self.failed = 0
         self.uploaded_video_id = None
         self.uploaded_photo_id = None
+        self.semaphore = None  # Created in run_all, inside the event loop
         
-    def test_endpoint(self, method, endpoint, expected_status=200, **kwargs):
-        """Test an endpoint and return response"""
-        url = f"{BASE_URL}{endpoint}"
+        # Look for test media once, not in every upload test
+        self.test_video = find_one(TEST_VIDEO_DIRS, ('.mp4', '.mov', '.avi'))
+        self.test_photo = find_one(TEST_PHOTO_DIRS, ('.jpg', '.jpeg', '.png', '.gif'))
+        
+    async def test_endpoint(self, method, endpoint, expected_status=200, parse_json=False, **kwargs):
+        """Test an endpoint and return response
+        
+        With parse_json=True, returns (success, response, data) where data
+        is the parsed body on success and None otherwise.
+        """
+        data = None
         try:
-            response = self.session.request(method, url, **kwargs)
+            async with self.semaphore:
+                response = await self.client.request(method, endpoint, **kwargs)
             if response.status_code == expected_status:
+                if parse_json:
+                    data = json_loads(response.content)
                 self.passed += 1
-                return True, response
+                success, resp = True, response
             else:
                 self.failed += 1
-                return False, response
+                success, resp = False, response
         except Exception as e:
             self.failed += 1
-            return False, str(e)
+            success, resp = False, str(e)
+        return (success, resp, data) if parse_json else (success, resp)
     
     # =========================================================================
     # UTILITY TESTS
     # =========================================================================
     
-    def test_health(self):
-        log_section("Testing Utility Endpoints")
-        
-        success, resp = self.test_endpoint("GET", "/utility/health")
+    async def test_health(self):
+        success, resp, data = await self.test_endpoint("GET", "/utility/health", parse_json=True)
         if success:
-            data = resp.json()
             if data.get('status') == 'healthy':
                 log_pass(f"Health check - Status: {data.get('status')}, Version: {data.get('version')}")
             else:
@@ -74,10 +147,9 @@ class APITester:
         else:
             log_fail(f"Health check failed: {resp}")
     
-    def test_algorithms(self):
-        success, resp = self.test_endpoint("GET", "/utility/algorithms")
+    async def test_algorithms(self):
+        success, resp, data = await self.test_endpoint("GET", "/utility/algorithms", parse_json=True)
         if success:
-            data = resp.json()
             if 'video' in data and 'photo' in data:
                 log_pass(f"Algorithms - Video: {len(data['video'])} algorithms, Photo: {len(data['photo'])} algorithms")
             else:
@@ -85,10 +157,9 @@ class APITester:
         else:
             log_fail(f"Algorithms endpoint failed: {resp}")
     
-    def test_formats(self):
-        success, resp = self.test_endpoint("GET", "/utility/formats")
+    async def test_formats(self):
+        success, resp, data = await self.test_endpoint("GET", "/utility/formats", parse_json=True)
         if success:
-            data = resp.json()
             if 'video' in data and 'image' in data:
                 log_pass(f"Formats - Video: {data['video']}, Image: {data['image'][:5]}...")
             else:
@@ -96,10 +167,9 @@ class APITester:
         else:
             log_fail(f"Formats endpoint failed: {resp}")
     
-    def test_limits(self):
-        success, resp = self.test_endpoint("GET", "/utility/limits")
+    async def test_limits(self):
+        success, resp, data = await self.test_endpoint("GET", "/utility/limits", parse_json=True)
         if success:
-            data = resp.json()
             if 'max_file_size_mb' in data:
                 log_pass(f"Limits - Max file: {data['max_file_size_mb']}MB, Expiry: {data.get('file_expiry_hours')}h")
             else:
@@ -111,12 +181,9 @@ class APITester:
     # SESSION TESTS
     # =========================================================================
     
-    def test_session_info(self):
-        log_section("Testing Session Endpoints")
-        
-        success, resp = self.test_endpoint("GET", "/session/")
+    async def test_session_info(self):
+        success, resp, data = await self.test_endpoint("GET", "/session/", parse_json=True)
         if success:
-            data = resp.json()
             if 'session_id' in data:
                 log_pass(f"Session info - ID: {data['session_id'][:20]}...")
             else:
@@ -124,10 +191,9 @@ class APITester:
         else:
             log_fail(f"Session info failed: {resp}")
     
-    def test_session_files(self):
-        success, resp = self.test_endpoint("GET", "/session/files")
+    async def test_session_files(self):
+        success, resp, data = await self.test_endpoint("GET", "/session/files", parse_json=True)
         if success:
-            data = resp.json()
             if 'uploads' in data:
                 log_pass(f"Session files - Uploads: {len(data['uploads'])}, Outputs: {len(data.get('outputs', {}))}")
             else:
@@ -139,27 +205,10 @@ class APITester:
     # VIDEO TESTS
     # =========================================================================
     
-    def test_video_upload(self):
+    async def test_video_upload(self):
         log_section("Testing Video Endpoints")
         
-        # Create a minimal test video file (not a real video, just for upload test)
-        test_file_path = "/tmp/test_video.mp4"
-        
-        # Check if a real test video exists
-        real_videos = [
-            "/Users/mac/Desktop/github/video-compressor/uploads",
-            "/Users/mac/Movies"
-        ]
-        
-        test_video = None
-        for path in real_videos:
-            if os.path.exists(path):
-                for f in os.listdir(path):
-                    if f.endswith(('.mp4', '.mov', '.avi')):
-                        test_video = os.path.join(path, f)
-                        break
-            if test_video:
-                break
+        test_video = self.test_video
         
         if not test_video:
             log_info("No test video found - skipping upload test")
@@ -167,10 +216,9 @@ class APITester:
         
         with open(test_video, 'rb') as f:
             files = {'video': (os.path.basename(test_video), f, 'video/mp4')}
-            success, resp = self.test_endpoint("POST", "/video/upload", files=files)
+            success, resp, data = await self.test_endpoint("POST", "/video/upload", files=files, parse_json=True)
         
         if success:
-            data = resp.json()
             if data.get('success') and 'file_id' in data:
                 self.uploaded_video_id = data['file_id']
                 log_pass(f"Video upload - ID: {data['file_id']}, Size: {data.get('size')}")
@@ -179,7 +227,7 @@ class APITester:
         else:
             log_fail(f"Video upload failed: {resp}")
     
-    def test_video_compress(self):
+    async def test_video_compress(self):
         if not self.uploaded_video_id:
             log_info("No uploaded video - skipping compression test")
             return
@@ -190,9 +238,8 @@ class APITester:
             "split_duration": 0
         }
         
-        success, resp = self.test_endpoint("POST", "/video/compress", json=payload)
+        success, resp, data = await self.test_endpoint("POST", "/video/compress", json=payload, parse_json=True)
         if success:
-            data = resp.json()
             if data.get('success'):
                 log_pass(f"Video compress - Algorithm: {data.get('algorithm')}, Parts: {data.get('total_parts')}")
             else:
@@ -204,28 +251,10 @@ class APITester:
     # PHOTO TESTS
     # =========================================================================
     
-    def test_photo_upload(self):
+    async def test_photo_upload(self):
         log_section("Testing Photo Endpoints")
         
-        # Look for a test image
-        test_dirs = [
-            "/Users/mac/Desktop/github/video-compressor/uploads",
-            "/Users/mac/Pictures",
-            "/Users/mac/Desktop"
-        ]
-        
-        test_photo = None
-        for path in test_dirs:
-            if os.path.exists(path):
-                for root, dirs, files in os.walk(path):
-                    for f in files:
-                        if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                            test_photo = os.path.join(root, f)
-                            break
-                    if test_photo:
-                        break
-            if test_photo:
-                break
+        test_photo = self.test_photo
         
         if not test_photo:
             log_info("No test photo found - skipping upload test")
@@ -233,10 +262,9 @@ class APITester:
         
         with open(test_photo, 'rb') as f:
             files = {'photo': (os.path.basename(test_photo), f, 'image/jpeg')}
-            success, resp = self.test_endpoint("POST", "/photo/upload", files=files)
+            success, resp, data = await self.test_endpoint("POST", "/photo/upload", files=files, parse_json=True)
         
         if success:
-            data = resp.json()
             if data.get('success') and 'file_id' in data:
                 self.uploaded_photo_id = data['file_id']
                 log_pass(f"Photo upload - ID: {data['file_id']}, Size: {data.get('size')}")
@@ -245,7 +273,7 @@ class APITester:
         else:
             log_fail(f"Photo upload failed: {resp}")
     
-    def test_photo_compress(self):
+    async def test_photo_compress(self):
         if not self.uploaded_photo_id:
             log_info("No uploaded photo - skipping compression test")
             return
@@ -256,9 +284,8 @@ class APITester:
             "format": "jpg"
         }
         
-        success, resp = self.test_endpoint("POST", "/photo/compress", json=payload)
+        success, resp, data = await self.test_endpoint("POST", "/photo/compress", json=payload, parse_json=True)
         if success:
-            data = resp.json()
             if data.get('success'):
                 log_pass(f"Photo compress - Ratio: {data.get('compression_ratio')}%, Format: {data.get('output_format')}")
             else:
@@ -270,12 +297,12 @@ class APITester:
     # ERROR HANDLING TESTS
     # =========================================================================
     
-    def test_error_handling(self):
+    async def test_error_handling(self):
         log_section("Testing Error Handling")
         
         # Test invalid file_id
         payload = {"file_id": "nonexistent-id", "algorithm": "neural_preserve"}
-        success, resp = self.test_endpoint("POST", "/video/compress", expected_status=404, json=payload)
+        success, resp = await self.test_endpoint("POST", "/video/compress", expected_status=404, json=payload)
         if success:
             log_pass("Invalid file_id returns 404")
         else:
@@ -284,7 +311,7 @@ class APITester:
         # Test invalid algorithm
         if self.uploaded_video_id:
             payload = {"file_id": self.uploaded_video_id, "algorithm": "invalid_algo"}
-            success, resp = self.test_endpoint("POST", "/video/compress", expected_status=400, json=payload)
+            success, resp = await self.test_endpoint("POST", "/video/compress", expected_status=400, json=payload)
             if success:
                 log_pass("Invalid algorithm returns 400")
             else:
@@ -295,55 +322,62 @@ class APITester:
     # CLEANUP
     # =========================================================================
     
-    def test_cleanup(self):
+    async def delete_file(self, file_id, kind):
+        success, resp = await self.test_endpoint("DELETE", f"/session/files/{file_id}")
+        if success:
+            log_pass(f"Deleted {kind} file: {file_id}")
+        else:
+            log_fail(f"Failed to delete {kind}: {resp}")
+    
+    async def test_cleanup(self):
         log_section("Cleanup")
         
         # Delete uploaded files
+        deletes = []
         if self.uploaded_video_id:
-            success, resp = self.test_endpoint("DELETE", f"/session/files/{self.uploaded_video_id}")
-            if success:
-                log_pass(f"Deleted video file: {self.uploaded_video_id}")
-            else:
-                log_fail(f"Failed to delete video: {resp}")
-        
+            deletes.append(self.delete_file(self.uploaded_video_id, "video"))
         if self.uploaded_photo_id:
-            success, resp = self.test_endpoint("DELETE", f"/session/files/{self.uploaded_photo_id}")
-            if success:
-                log_pass(f"Deleted photo file: {self.uploaded_photo_id}")
-            else:
-                log_fail(f"Failed to delete photo: {resp}")
+            deletes.append(self.delete_file(self.uploaded_photo_id, "photo"))
+        await asyncio.gather(*deletes)
     
     # =========================================================================
     # RUN ALL TESTS
     # =========================================================================
     
-    def run_all(self):
+    async def run_all(self):
         print(f"\n{BLUE}MediaPress API Test Suite{RESET}")
         print(f"{BLUE}Base URL: {BASE_URL}{RESET}\n")
         
-        # Utility tests
-        self.test_health()
-        self.test_algorithms()
-        self.test_formats()
-        self.test_limits()
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        
+        # Session info first so the session cookie is set before the
+        # concurrent requests - otherwise each would start its own session
+        log_section("Testing Utility & Session Endpoints")
+        await self.test_session_info()
         
-        # Session tests
-        self.test_session_info()
-        self.test_session_files()
+        # The rest are independent - run them together
+        await asyncio.gather(
+            self.test_health(),
+            self.test_algorithms(),
+            self.test_formats(),
+            self.test_limits(),
+            self.test_session_files()
+        )
         
-        # Video tests
-        self.test_video_upload()
-        self.test_video_compress()
+        # Video tests (compress needs the upload)
+        await self.test_video_upload()
+        await self.test_video_compress()
         
         # Photo tests  
-        self.test_photo_upload()
-        self.test_photo_compress()
+        await self.test_photo_upload()
+        await self.test_photo_compress()
         
         # Error handling
-        self.test_error_handling()
+        await self.test_error_handling()
         
         # Cleanup
-        self.test_cleanup()
+        await self.test_cleanup()
+        await self.client.aclose()
         
         # Summary
         log_section("Test Summary")
@@ -362,5 +396,5 @@ class APITester:
 
 if __name__ == '__main__':
     tester = APITester()
-    success = tester.run_all()
+    success = asyncio.run(tester.run_all())
     sys.exit(0 if success else 1)
@@ -0,0 +1,69 @@
+"""
+Photo Algorithm Tests
+=====================
+Run from the project root: python -m unittest discover -s tests -t .
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from src.photo_algorithms import (
+    ANALYSIS_MAX_DIM, compress_balanced_pro, compress_clarity_max, detect_image_type
+)
+
+
+def flat_tile_graphic(columns: int = 364, rows: int = 273, tile: int = 11) -> Image.Image:
+    """A large graphic of flat tiles, each a distinct color close to its neighbours"""
+    i = np.arange(rows)[:, None]
+    j = np.arange(columns)[None, :]
+    rgb = np.stack([
+        np.broadcast_to(i & 255, (rows, columns)),
+        np.broadcast_to(j & 255, (rows, columns)),
+        (i >> 8) * 64 + (j >> 8) * 16
+    ], axis=-1).astype(np.uint8)
+    return Image.fromarray(np.repeat(np.repeat(rgb, tile, axis=0), tile, axis=1))
+
+
+class DetectImageTypeTest(unittest.TestCase):
+    def test_large_flat_color_graphic_is_graphic(self):
+        # ~100k colors over 12 MP is a limited palette, even though a
+        # 1024 px copy would show a new color every few pixels
+        img = flat_tile_graphic()
+        self.assertGreater(max(img.size), ANALYSIS_MAX_DIM)
+        self.assertEqual(detect_image_type(img), 'graphic')
+    
+    def test_noise_is_photo(self):
+        rng = np.random.default_rng(0)
+        img = Image.fromarray(rng.normal(128, 20, (1500, 2000, 3)).clip(0, 255).astype(np.uint8))
+        self.assertEqual(detect_image_type(img), 'photo')
+
+
+class CompressorImageTypeTest(unittest.TestCase):
+    """The compressors must classify a large JPEG like its full decode does"""
+    
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        # 4002x3000 with ~0.022 colors per pixel: a graphic at full scale,
+        # a photo if classified on a 1/2-scale JPEG draft
+        self.input_path = os.path.join(self.tmp, 'graphic.jpg')
+        flat_tile_graphic(667, 500, 6).save(self.input_path, quality=90)
+    
+    def test_balanced_pro_keeps_graphic_quality(self):
+        result = compress_balanced_pro(self.input_path, os.path.join(self.tmp, 'balanced.jpg'))
+        self.assertTrue(result.success, result.message)
+        self.assertEqual(result.message, "Balanced compression. Quality: 85%, Type: graphic")
+    
+    def test_clarity_max_detects_graphic(self):
+        result = compress_clarity_max(self.input_path, os.path.join(self.tmp, 'clarity.jpg'))
+        self.assertTrue(result.success, result.message)
+        self.assertEqual(result.message, "Premium quality compression. Detected: graphic")
+
+
+if __name__ == '__main__':
+    unittest.main()
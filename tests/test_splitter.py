@@ -0,0 +1,57 @@
+"""
+Video Splitter Tests
+====================
+Run from the project root: python -m unittest discover -s tests -t .
+"""
+
+import unittest
+from unittest import mock
+
+from src import splitter
+from src.splitter import _snap_to_keyframes
+
+
+class SnapToKeyframesTest(unittest.TestCase):
+    def test_sparse_keyframes_keep_parts_within_segment_duration(self):
+        # Keyframes every 7 s on a 75 s clip: the nearest keyframe to 30 s
+        # and 60 s would give a 35 s part
+        keyframes = [float(t) for t in range(0, 75, 7)]
+        cuts = _snap_to_keyframes(keyframes, 75.0, 30)
+        
+        self.assertIsNotNone(cuts)
+        bounds = [0.0] + cuts + [75.0]
+        parts = [end - start for start, end in zip(bounds, bounds[1:])]
+        self.assertTrue(all(part <= 30 for part in parts), parts)
+        self.assertTrue(set(cuts) <= set(keyframes))
+    
+    def test_keyframe_on_boundary_is_used(self):
+        self.assertEqual(_snap_to_keyframes([0.0, 10.0, 20.0, 30.0], 35.0, 10), [10.0, 20.0, 30.0])
+    
+    def test_gop_longer_than_segment_has_no_copy_cuts(self):
+        self.assertIsNone(_snap_to_keyframes([0.0, 40.0], 75.0, 30))
+    
+    def test_short_video_needs_no_cuts(self):
+        self.assertEqual(_snap_to_keyframes([0.0, 7.0], 25.0, 30), [])
+
+
+class KeyframeTimesTest(unittest.TestCase):
+    def test_keyframes_come_from_packet_flags(self):
+        probe = {
+            'format': {'start_time': '1.000000'},
+            'packets': [
+                {'pts_time': '1.000000', 'flags': 'K__'},
+                {'pts_time': '1.500000', 'flags': '___'},
+                {'pts_time': '8.000000', 'flags': 'K_'},
+                {'pts_time': '4.500000', 'flags': 'K__'},  # decode order
+                {'pts_time': 'N/A', 'flags': 'K__'},
+            ]
+        }
+        with mock.patch.object(splitter.ffmpeg, 'probe', return_value=probe) as fake:
+            times = splitter._keyframes_cached.__wrapped__('clip.mp4', (0, 0))
+        
+        self.assertEqual(times, (0.0, 3.5, 7.0))
+        self.assertNotIn('skip_frame', fake.call_args.kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@
 VideoPress Windows Service
 ==========================
 Installs VideoPress as a Windows Service for automatic startup.
+Windows only - on Linux run gunicorn with gunicorn.conf.py instead
+(see DEPLOY.md).
 
 Usage (run as Administrator):
   Install:   python videopress_service.py install